@@ -1,60 +1,325 @@
 import asyncio
 import discord_helpers
+from time import time
+from Classes.concurrency import gather_bounded
 from Classes.database import StreamerDatabase, ServerManageDatabase
+from Classes.exceptions import TwitchAuthorizationError, TwitchRequestError
+from Classes.poll_scheduler import PollScheduler
 from Classes.twitch_streamer import TwitchStreamer
 from discord.ext import commands
 
 
 class CheckLive:
+    """ Polls twitch for every streamer any guild has set notifications for,
+    and announces streamers that have gone live to every subscribed guild.
+    Go live and offline events pushed by EventSub are fed in through
+    stream_online and stream_offline, in which case polling only catches
+    anything EventSub missed.
+
+    === Public Attributes ===
+    announced_streamers: maps a lowercase streamer login to whether they were
+                         live on the last check. saved to the database when
+                         it changes so restarts don't announce streams again
+    subscriptions: maps a lowercase streamer login to the ids of the guilds
+                   that want notifications for them
+    twitch_users: maps a lowercase streamer login to a tuple of their
+                  (twitch user id, display name, unix time last validated)
+    revalidate_after: seconds before a validated streamer is checked again
+    revalidate_batch: max number of streamers checked again per tick
+    scheduler: picks which streamers are polled each tick
+    history_age: seconds go live times are kept in the database for the
+                 scheduler
+    workers: max number of announcements sent at the same time
+    stats: tick metrics, number of ticks run and skipped because the last was
+           still running, and the duration of the last and longest tick
+    streamer_db: database holding each guilds streamers
+    server_manage_db: database holding each guilds announcement channel
+
+    === Private Attributes ===
+    _tick: task of the last tick started by start_tick
+    _changed: live states changed since they were last saved
+    _go_live: (login, unix time) of every go live recorded by the scheduler
+              since they were last saved
+
+    """
 
     def __init__(self, streamer_db: StreamerDatabase,
-                 server_manage_db: ServerManageDatabase):
+                 server_manage_db: ServerManageDatabase,
+                 revalidate_after=86400, revalidate_batch=100,
+                 scheduler=None, workers=8, history_age=12 * 7 * 86400):
         self.announced_streamers = {}
+        self.subscriptions = {}
+        self.twitch_users = {}
+        self.revalidate_after = revalidate_after
+        self.revalidate_batch = revalidate_batch
+        self.scheduler = scheduler if scheduler is not None else PollScheduler()
+        self.history_age = history_age
+        self.workers = workers
+        self.stats = {'ticks': 0, 'skipped_ticks': 0,
+                      'last_tick_duration': 0.0, 'max_tick_duration': 0.0}
+        self._tick = None
+        self._changed = {}
+        self._go_live = []
         self.streamer_db = streamer_db
         self.server_manage_db = server_manage_db
 
+    async def load_state(self) -> None:
+        """ Loads who was live when the bot last checked, so the first tick
+        after a restart only announces streamers that went live since, and
+        when streamers went live so the scheduler knows when they usually do.
+        """
+        self.announced_streamers = await self.streamer_db.get_live_states()
+        since = int(time()) - self.history_age
+        await self.streamer_db.remove_go_live_times(since)
+        self.scheduler.load_history(
+            await self.streamer_db.get_go_live_history(since),
+            [login for login, is_live in self.announced_streamers.items()
+             if is_live])
+
+    async def save_state(self) -> None:
+        """ Saves the live states that changed and the go live times recorded
+        since they were last saved.
+        """
+        if self._go_live:
+            go_live, self._go_live = self._go_live, []
+            try:
+                await self.streamer_db.save_go_live_times(go_live)
+            except Exception:
+                self._go_live = go_live + self._go_live
+                raise
+        if self._changed:
+            changed, self._changed = self._changed, {}
+            try:
+                await self.streamer_db.save_live_states(changed)
+            except Exception:
+                changed.update(self._changed)  # keep them for the next save
+                self._changed = changed
+                raise
+
+    async def _try_save_state(self) -> None:
+        """ save_state, logging a failure instead of raising it. the changes
+        stay waiting for the next save, so announcing can go ahead.
+        """
+        try:
+            await self.save_state()
+        except Exception as e:
+            print('Could not save live states:', e, type(e))
+
+    def start_tick(self, bot: commands.bot, after=None) -> bool:
+        """ Starts a live check in the background followed by the coroutine
+        function :after:, and return True. If the last tick is still running
+        this tick is skipped and False is returned, so slow ticks never pile
+        up on each other.
+        """
+        if self._tick is not None and not self._tick.done():
+            self.stats['skipped_ticks'] += 1
+            print('Live check still running, skipped a tick. stats: ' +
+                  str(self.stats))
+            return False
+        self._tick = asyncio.ensure_future(self._run_tick(bot, after))
+        return True
+
+    async def _run_tick(self, bot: commands.bot, after) -> None:
+        start = time()
+        try:
+            await self.check_live(bot)
+            if after is not None:
+                await after()
+        except Exception as e:  # nothing awaits this task to see the error
+            print('Live check failed:', e, type(e))
+        finally:
+            duration = time() - start
+            self.stats['ticks'] += 1
+            self.stats['last_tick_duration'] = duration
+            self.stats['max_tick_duration'] = max(
+                duration, self.stats['max_tick_duration'])
+
     async def check_live(self, bot: commands.bot) -> None:
-        for guild in bot.guilds:
-            gid = str(guild.id)
-            streamers = await self.streamer_db.get_streamers(gid)
-            streamers = await self.build_streamers(streamers)
-            a_chnl_id = await self.server_manage_db.get_announcement_chnl(gid)
-            a_chnl = bot.get_channel(int(a_chnl_id))
-            default_role = guild.default_role
-
-            if guild.id not in self.announced_streamers:
-                self.build_dict(guild.id, streamers)
-
-            for streamer in streamers:
-                name = streamer.streamer_name
-                if name not in self.announced_streamers[guild.id]:
-                    self.announced_streamers[guild.id][name] = False
-
-                if await self.check_streamer(streamer, guild.id) and a_chnl is not None:
-                    msg = str(default_role) + ' ' + name + \
-                          ' has gone live! check them out at https://www.twitch.tv/'\
-                          + name + '\nTitle: ' + streamer.stream_title + '\nGame: ' + \
-                          streamer.stream_game + '\nViewers: ' + str(streamer.viewers)
-                    msg = discord_helpers.markdownify_message(msg)
-                    await a_chnl.send(msg)
+        """ Runs one tick: gathers every guilds streamers, polls the ones
+        due, works out who went live and announces them to their guilds.
+        """
+        guild_ids = [str(guild.id) for guild in bot.guilds]
+        self.subscriptions = await self.streamer_db.get_subscriptions(guild_ids)
+        self.scheduler.sync(self.subscriptions)
+        try:
+            streamers = await self.build_streamers(self.scheduler.due())
+        except (TwitchRequestError, TwitchAuthorizationError) as e:
+            print(e)  # try again next tick instead of stopping the loop
+            return
+
+        went_live = []
+        for streamer in streamers:
+            self._record(streamer.streamer_name, streamer.is_live)
+            if await self.check_streamer(streamer):
+                went_live.append(streamer)
+        await self._try_save_state()
+        await self.announce(bot, went_live)
+
+        try:
+            await self.revalidate_users()
+        except TwitchRequestError as e:
+            print(e)
+
+    async def stream_online(self, bot: commands.bot, event: dict) -> None:
+        """ Announces the streamer of an EventSub stream.online :event:,
+        unless they were already announced.
+        """
+        login = event['broadcaster_user_login'].lower()
+        if login not in self.subscriptions:
+            return
+
+        streamer = TwitchStreamer(login, event['broadcaster_user_id'],
+                                  event['broadcaster_user_name'])
+        for attempt in range(3):
+            # helix can take a few seconds to list a stream that just started
+            try:
+                await streamer.update_streamer_info()
+            except TwitchRequestError as e:
+                print(e)
+            if streamer.is_live or attempt == 2:
+                break
+            await asyncio.sleep(5)
+        streamer.is_live = True  # the event is proof enough they are live
+        self._record(login, True)
+
+        if await self.check_streamer(streamer):
+            await self._try_save_state()
+            await self.announce(bot, [streamer])
+
+    async def stream_offline(self, event: dict) -> None:
+        """ Marks the streamer of an EventSub stream.offline :event: as
+        offline, so they are announced again when they next go live.
+        """
+        login = event['broadcaster_user_login'].lower()
+        if self.announced_streamers.get(login, False):
+            self.announced_streamers[login] = False
+            self._changed[login] = False
+            await self.save_state()
+        if login in self.subscriptions:
+            self._record(login, False)
+
+    def _record(self, login: str, is_live: bool) -> None:
+        """ records a poll or event finding :login: :is_live: with the
+        scheduler, keeping the time for the next save if they just went live.
+        """
+        now = time()
+        if self.scheduler.record(login, is_live, now):
+            self._go_live.append((login, int(now)))
+
+    async def subscribed_user_ids(self) -> set:
+        """ return the twitch user ids of every validated streamer a guild
+        wants notifications for, including ones not polled since startup.
+        """
+        await self._load_twitch_users(list(self.subscriptions))
+        return {self.twitch_users[login][0] for login in self.subscriptions
+                if login in self.twitch_users}
+
+    async def announce(self, bot: commands.bot, streamers: list) -> None:
+        """ Sends a go live message for every TwitchStreamer in :streamers: to
+        the announcement channel of every guild subscribed to them, up to
+        workers messages at a time.
+        """
+        sends = [self._send_announcement(bot, gid, streamer)
+                 for streamer in streamers
+                 for gid in self.subscriptions.get(streamer.streamer_name, [])]
+        results = await gather_bounded(sends, self.workers,
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):  # one guild failing can't stop the rest
+                print('Could not announce:', result, type(result))
+
+    async def _send_announcement(self, bot: commands.bot, gid: str,
+                                 streamer: TwitchStreamer) -> None:
+        guild = bot.get_guild(int(gid))
+        if guild is None:
+            return
+        # served from the guild settings snapshot, no query per tick
+        a_chnl_id = await self.server_manage_db.get_announcement_chnl(gid)
+        a_chnl = bot.get_channel(int(a_chnl_id)) if a_chnl_id else None
+        if a_chnl is None:
+            return
+
+        name = streamer.streamer_name
+        msg = str(guild.default_role) + ' ' + streamer.display_name + \
+              ' has gone live! check them out at https://www.twitch.tv/'\
+              + name + '\nTitle: ' + streamer.stream_title + '\nGame: ' + \
+              streamer.stream_game + '\nViewers: ' + str(streamer.viewers)
+        msg = discord_helpers.markdownify_message(msg)
+        await a_chnl.send(msg)
 
     async def build_streamers(self, streamers: list) -> list:
+        """ return a list of updated TwitchStreamers for the logins in
+        :streamers:. Streamers with a saved twitch user id are not validated
+        again, and streamers validated for the first time are saved.
+        """
+        await self._load_twitch_users(streamers)
+
         to_return = []
-        for streamer in streamers:
-            ts = TwitchStreamer(streamer)
-            await ts.update_streamer_info()
-            to_return.append(ts)
+        for login in streamers:
+            user = self.twitch_users.get(login)
+            if user is not None:
+                to_return.append(TwitchStreamer(login, user[0], user[1]))
+            else:
+                to_return.append(TwitchStreamer(login))
+        await TwitchStreamer.update_streamers(to_return)
+
+        validated = [(s.streamer_name, s.user_id, s.display_name)
+                     for s in to_return
+                     if s.valid and s.streamer_name not in self.twitch_users]
+        if validated:
+            await self.streamer_db.save_twitch_users(validated)
+            now = int(time())
+            for login, user_id, display_name in validated:
+                self.twitch_users[login] = (user_id, display_name, now)
         return to_return
 
-    def build_dict(self, guild_id, streamers: list):
-        self.announced_streamers[guild_id] = {}
-        for streamer in streamers:
-            self.announced_streamers[guild_id][streamer.streamer_name] = False
+    async def _load_twitch_users(self, logins: list) -> None:
+        """ loads the saved twitch users of the logins in :logins: that
+        aren't in twitch_users yet.
+        """
+        unknown = [login for login in logins if login not in self.twitch_users]
+        if unknown:
+            self.twitch_users.update(
+                await self.streamer_db.get_twitch_users(unknown))
 
-    async def check_streamer(self, s: TwitchStreamer, guild_id) -> bool:
-        if self.announced_streamers[guild_id][s.streamer_name]:
-            self.announced_streamers[guild_id][s.streamer_name] = s.is_live
-            return False
-        else:
-            self.announced_streamers[guild_id][s.streamer_name] = s.is_live
-            return s.is_live
+    async def revalidate_users(self) -> None:
+        """ Looks up to revalidate_batch streamers whose validation is older
+        than revalidate_after up by user id, refreshing their display name.
+        Streamers whose id no longer exists are forgotten, so they are
+        validated by login again on the next tick.
+        """
+        cutoff = time() - self.revalidate_after
+        stale = [login for login, user in self.twitch_users.items()
+                 if user[2] < cutoff][:self.revalidate_batch]
+        if not stale:
+            return
+
+        found = await TwitchStreamer.get_users_by_id(
+            [self.twitch_users[login][0] for login in stale])
+        refreshed = []
+        gone = []
+        for login in stale:
+            user = found.get(self.twitch_users[login][0])
+            if user is not None:
+                refreshed.append((login, user['id'], user['display_name']))
+            else:
+                gone.append(login)
+
+        if refreshed:
+            await self.streamer_db.save_twitch_users(refreshed)
+            now = int(time())
+            for login, user_id, display_name in refreshed:
+                self.twitch_users[login] = (user_id, display_name, now)
+        if gone:
+            await self.streamer_db.remove_twitch_users(gone)
+            for login in gone:
+                del self.twitch_users[login]
+
+    async def check_streamer(self, s: TwitchStreamer) -> bool:
+        """ return whether :s: has gone live since the last check.
+        """
+        was_live = self.announced_streamers.get(s.streamer_name, False)
+        if was_live != s.is_live:
+            self.announced_streamers[s.streamer_name] = s.is_live
+            self._changed[s.streamer_name] = s.is_live
+        return s.is_live and not was_live
@@ -0,0 +1,15 @@
+import asyncio
+
+
+async def gather_bounded(coros, limit: int, return_exceptions=False) -> list:
+    """ return the results of awaiting every coroutine in :coros:, running at
+    most :limit: of them at the same time. results are in the order of :coros:.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(run(coro) for coro in coros),
+                                return_exceptions=return_exceptions)
@@ -0,0 +1,261 @@
+import asyncio
+import glob
+import os
+from typing import Dict, Optional
+
+
+class CreditLedger:
+    """ Write behind ledger of player credits. Credit changes are applied to
+    in memory balances straight away and appended to a log file on disk, then
+    the net change of every player is written to MySQL in one batched
+    statement every flush_interval seconds or once flush_size players have
+    changes waiting, whichever comes first.
+
+    A crash can't lose credits: every flush records the sequence number of
+    the last log entry it covered in the same transaction, and on startup
+    log entries newer than that are applied again.
+
+    === Public Attributes ===
+    flush_interval: seconds between flushes
+    flush_size: number of players with changes waiting that triggers a flush
+    max_players: balances kept in memory after a flush before players with
+                 nothing waiting are forgotten
+    fsync: whether log entries are forced to disk before add returns
+    sync_window: seconds log entries are gathered for before one fsync covers
+                 all of them
+    epoch: number of times balances were forgotten, a balance loaded from the
+           database while this changed may be missing a flush
+
+    === Private Attributes ===
+    _db: GamesDatabase credits are loaded from and flushed to
+    _log_path: path of the log file, flushed logs get .<sequence> added
+    _log: the open log file
+    _seq: sequence number of the last log entry written
+    _rotated_seq: sequence number the log was last rotated at
+    _balances: maps a player id to their current balance
+    _pending: maps a player id to their net change not yet flushed
+    _lock: held while flushing so flushes don't overlap
+    _task: the background flush loop
+    _sync: future resolved by the next group fsync, None if none is waiting
+    _unsynced: duplicated descriptors of logs rotated away before their
+               entries were synced, synced by the next group fsync
+
+    """
+
+    def __init__(self, db, log_path='credit_ledger.log', flush_interval=1.0,
+                 flush_size=500, max_players=10000, fsync=True,
+                 sync_window=0.005):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_players = max_players
+        self.fsync = fsync
+        self.sync_window = sync_window
+        self.epoch = 0
+        self._db = db
+        self._log_path = log_path
+        self._log = None
+        self._seq = 0
+        self._rotated_seq = 0
+        self._balances: Dict[str, int] = {}
+        self._pending: Dict[str, int] = {}
+        self._lock = None
+        self._task = None
+        self._sync = None
+        self._unsynced = []
+
+    async def start(self) -> None:
+        """ applies anything a crash left in the logs, then starts flushing in
+        the background. does nothing if already started.
+        """
+        if self._task is not None:
+            return
+        self._lock = asyncio.Lock()
+        checkpoint = await self._db.get_ledger_checkpoint()
+        self._seq = checkpoint
+        for path in self._log_files():
+            suffix = path[len(self._log_path) + 1:]
+            if suffix.isdigit():
+                self._rotated_seq = max(self._rotated_seq, int(suffix))
+            with open(path) as log:
+                for line in log:
+                    parts = line.split()
+                    if len(parts) != 3:
+                        continue  # the crash cut this entry off part way
+                    seq, player_id, delta = int(parts[0]), parts[1], int(parts[2])
+                    self._seq = max(self._seq, seq)
+                    if seq > checkpoint:
+                        self._pending[player_id] = \
+                            self._pending.get(player_id, 0) + delta
+
+        self._log = open(self._log_path, 'a')
+        if self._pending:
+            print('Recovering credits of ' + str(len(self._pending)) +
+                  ' players from the credit ledger')
+            await self.flush()
+        else:
+            self._remove_flushed_logs(self._seq)
+        self._task = asyncio.ensure_future(self._run())
+
+    async def close(self) -> None:
+        """ stops the background loop and flushes everything left.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._sync is not None:
+            await asyncio.shield(self._sync)
+        if self._log is not None:
+            await self.flush()
+            self._log.close()
+            self._log = None
+
+    async def balance(self, player_id: str) -> int:
+        """ return the current credits of :player_id:.
+        """
+        while player_id not in self._balances:
+            epoch = self.epoch
+            creds = await self._db.load_player_credits(player_id)
+            # another call may have loaded and changed it while we waited
+            self.seed(player_id, creds, epoch)
+        return self._balances[player_id]
+
+    def seed(self, player_id: str, creds: int, epoch: int) -> None:
+        """ remembers :creds: as the stored credits of :player_id:, loaded
+        when self.epoch was :epoch:, unless their balance is already held.
+        """
+        if epoch == self.epoch:
+            self._balances.setdefault(player_id, creds)
+
+    async def add(self, player_id: str, creds: int,
+                  floor: Optional[int] = None) -> Optional[int]:
+        """ adds :creds: to the credits of :player_id: and return their new
+        balance. if :floor: is given nothing changes unless the balance stays
+        at or above it, and None is returned. with fsync this returns once the
+        change is on disk, sharing one fsync with every change made around
+        the same time so the event loop never waits on the disk.
+        """
+        if self._log is None:
+            raise RuntimeError('The credit ledger has not been started')
+        balance = await self.balance(player_id) + creds
+        if floor is not None and balance < floor:
+            return None
+        if creds == 0:
+            return balance
+
+        self._seq += 1
+        self._log.write(str(self._seq) + ' ' + player_id + ' ' + str(creds) +
+                        '\n')
+        self._log.flush()
+        self._balances[player_id] = balance
+        self._pending[player_id] = self._pending.get(player_id, 0) + creds
+
+        if len(self._pending) >= self.flush_size:
+            asyncio.ensure_future(self._flush_quietly())
+        if self.fsync:
+            await self._synced()
+        return balance
+
+    async def _synced(self) -> None:
+        """ waits for the next group fsync, starting one if none is waiting.
+        """
+        if self._sync is None:
+            self._sync = asyncio.get_event_loop().create_future()
+            asyncio.ensure_future(self._group_sync(self._sync))
+        await asyncio.shield(self._sync)
+
+    async def _group_sync(self, done: asyncio.Future) -> None:
+        """ after sync_window, fsyncs every log entry written so far in a
+        worker thread and resolves :done:.
+        """
+        await asyncio.sleep(self.sync_window)
+        self._sync = None  # entries from now on wait for the next group
+        # duplicates stay valid if the log is rotated while syncing
+        fds, self._unsynced = self._unsynced, []
+        if self._log is not None:
+            fds.append(os.dup(self._log.fileno()))
+        try:
+            await asyncio.get_event_loop().run_in_executor(
+                None, _fsync_all, fds)
+        except OSError as e:  # the entries still reach mysql with the flush
+            print('Credit ledger fsync failed:', e, type(e))
+        done.set_result(None)
+
+    async def flush(self) -> None:
+        """ writes the net change of every player with changes waiting to the
+        database in one transaction.
+        """
+        if not self._pending or self._lock is None:
+            return
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            seq = self._seq
+            self._rotate_log(seq)
+            try:
+                await self._db.apply_credit_changes(batch, seq)
+            except Exception:
+                for player_id, creds in batch.items():
+                    self._pending[player_id] = \
+                        self._pending.get(player_id, 0) + creds
+                raise
+            self._remove_flushed_logs(seq)
+
+            if len(self._balances) > self.max_players:
+                self.epoch += 1
+                self._balances = {player_id: creds for player_id, creds
+                                  in self._balances.items()
+                                  if player_id in self._pending}
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush_quietly()
+
+    async def _flush_quietly(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:  # changes stay waiting for the next flush
+            print('Credit ledger flush failed:', e, type(e))
+
+    def _rotate_log(self, seq: int) -> None:
+        """ moves the entries up to :seq: to their own file, so they can be
+        deleted once flushed while new entries go to a fresh log. does
+        nothing if no entry was written since the last rotation, as when
+        retrying a failed flush, so the rotated file is never overwritten.
+        """
+        if seq == self._rotated_seq:
+            return
+        self._rotated_seq = seq
+        if self._sync is not None:  # its entries still need the group fsync
+            self._unsynced.append(os.dup(self._log.fileno()))
+        self._log.close()
+        os.replace(self._log_path, self._log_path + '.' + str(seq))
+        self._log = open(self._log_path, 'a')
+
+    def _remove_flushed_logs(self, seq: int) -> None:
+        for path in self._log_files():
+            suffix = path[len(self._log_path) + 1:]
+            if suffix.isdigit() and int(suffix) <= seq:
+                os.remove(path)
+
+    def _log_files(self) -> list:
+        """ return the flushed logs oldest first, followed by the current log.
+        """
+        rotated = [path for path in glob.glob(glob.escape(self._log_path) + '.*')
+                   if path[len(self._log_path) + 1:].isdigit()]
+        rotated.sort(key=lambda path: int(path[len(self._log_path) + 1:]))
+        if os.path.exists(self._log_path):
+            rotated.append(self._log_path)
+        return rotated
+
+
+def _fsync_all(fds: list) -> None:
+    """ fsyncs then closes every file descriptor of :fds:.
+    """
+    try:
+        for fd in fds:
+            os.fsync(fd)
+    finally:
+        for fd in fds:
+            os.close(fd)
@@ -1,20 +1,47 @@
 import aiomysql
-import asyncio
-import config
+import re
+from Classes.credit_ledger import CreditLedger
+from Classes.db_pool import connection_pool
+from Classes.guild_settings import GuildSettings
+from Classes.lru_cache import LRUCache
+from functools import lru_cache
 from time import time
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 """
 Tables we have: 
 announce_chnl - two column Guild_ID Announcement_ID, stores 2 values a guild id 
                 and corresponding channel id
-gid_streamers - one column Streamer_login, stores streamer names for a server
-gid_banned - stores user ids of banned users
+guild_streamers - two columns Guild_ID Streamer_login, stores the streamers
+                  each guild wants notifications for
+guild_bans - two columns Guild_ID User_ID, stores the users banned from using
+             commands in each guild
+gid_streamers, gid_bannedusers - old per guild versions of the two tables
+                                 above, moved over by GuildTableMigration
 players - 3 columns Player_ID Credits Daily_Reset, stores an id number of 
           credits and unix time of last daily
+twitch_games - two columns Game_ID Name, caches twitch game names by id
+twitch_users - 4 columns Streamer_login User_ID Display_Name Validated_At,
+               stores the twitch user of a validated login and unix time it
+               was last validated
+twitch_live_state - 3 columns Streamer_login Is_Live Changed_At, stores
+                    whether a streamer was live on the last check and the unix
+                    time that last changed
+twitch_go_live - two columns Streamer_login Went_Live_At, stores the unix
+                 times streamers went live, used by PollScheduler to poll
+                 them more often around the times they usually go live
+credit_ledger_checkpoint - two columns Id Seq, one row storing the last
+                           CreditLedger entry applied to players
+schema_version - 3 columns Version Description Applied_At, stores which
+                 SchemaMigrations have been applied
+
+players and announce_chnl are created without keys for old installs, the
+SchemaMigrations add them.
 
 """
 
+_identifier = re.compile(r'[A-Za-z0-9_]+')
+
 
 class _DatabaseInteraction:
     """ Class to query and send commands to a MySQl server.
@@ -22,54 +49,79 @@ class _DatabaseInteraction:
     === Public Attributes ===
 
     === Private Attributes ===
-    _pool: pool of connections to our MySQL server
+    _pool: pool of connections to our MySQL server, shared by every instance
+    _chunk_size: max rows written by one statement of the bulk methods
+    _fetch_size: rows fetched from the server at a time by stream
 
     === Representation Invariants ===
 
     """
-    _pool: aiomysql.pool
-
+    _pool = connection_pool
+    _chunk_size = 500
+    _fetch_size = 1000
 
     async def initialize(self):
-        """ creates a MySQL instance by connecting to a server with the given
-        credentials, and assigns us a pool of ways to interact with a specified
-        database on our server.
-        """
-        initial_conn = await aiomysql.connect(
-            host=config.mysql_host,
-            port=config.mysql_port,
-            user=config.mysql_user,
-            password=config.mysql_password,
-            autocommit=True,
-            loop=asyncio.get_event_loop()
-        )
-
-        async with initial_conn.cursor() as cur:
-            await cur.execute('CREATE DATABASE IF NOT EXISTS ' +
-                              config.mysql_database_name + ';')
-        initial_conn.close()
-
-        self._pool = await aiomysql.create_pool(
-            host=config.mysql_host,
-            port=config.mysql_port,
-            user=config.mysql_user,
-            password=config.mysql_password,
-            autocommit=True,
-            db=config.mysql_database_name,
-            loop=asyncio.get_event_loop()
-        )
-
-    async def execute(self, cmd: str, return_results=False) -> \
+        """ connects to the MySQL server and opens the shared pool of
+        connections to our database, if no other database class has yet.
+        """
+        await self._pool.initialize()
+
+    async def execute(self, cmd: str, params=None, return_results=False) -> \
             Optional[List[tuple]]:
-        """ Executes cmd on MySQL server. returns results if :return_results:.
+        """ Executes cmd on MySQL server, binding :params: to its %s
+        placeholders. returns results if :return_results:.
         """
         async with self._pool.acquire() as conn:
             async with conn.cursor() as cur:
-                await cur.execute(cmd)
+                await cur.execute(cmd, params)
                 result = await cur.fetchall() if return_results else None
                 await cur.close()
         return result
 
+    async def stream(self, cmd: str, params=None):
+        """ Executes cmd on MySQL server like execute, yielding its result rows
+        as an async iterator. rows are read from an unbuffered server side
+        cursor _fetch_size at a time, so large results are never held in
+        memory at once. the connection stays taken until iteration ends, so
+        don't run other queries while iterating.
+        """
+        async with self._pool.acquire() as conn:
+            async with conn.cursor(aiomysql.SSCursor) as cur:
+                await cur.execute(cmd, params)
+                while True:
+                    rows = await cur.fetchmany(self._fetch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield row
+
+    async def execute_write(self, cmd: str, params=None) -> Tuple[int, int]:
+        """ Executes the write cmd on MySQL server, binding :params: to its %s
+        placeholders. returns a tuple of (rows changed, last insert id).
+        """
+        async with self._pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(cmd, params)
+                result = (cur.rowcount, cur.lastrowid)
+                await cur.close()
+        return result
+
+    async def execute_transaction(self, commands: List[Tuple[str, list]]) \
+            -> None:
+        """ Executes every (cmd, params) pair of :commands: in one transaction,
+        so either all of them take effect or none do.
+        """
+        async with self._pool.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cur:
+                    for cmd, params in commands:
+                        await cur.execute(cmd, params)
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
+
     async def create_table(self, table_name: str,
                      columns_name_type: List[str]) -> None:
         """ will create a table with name :table: if it doesnt already exist.
@@ -77,6 +129,7 @@ class _DatabaseInteraction:
         precondition: values in :columns_name_type: must follow correct MySQL
         syntax where there is a column name followed by a data type for it.
         """
+        _check_identifier(table_name)
         command = 'CREATE TABLE IF NOT EXISTS ' + table_name + '('
         for item in columns_name_type:
             command += item + ', '
@@ -84,82 +137,252 @@ class _DatabaseInteraction:
 
         await self.execute(command)
 
-    async def in_table(self,  table: str, row: str, to_find: str) -> bool:
-        """ return whether :to_find: is in :row: of :table:.
+    async def in_table(self,  table: str, row: str, to_find) -> bool:
+        """ return whether :to_find: is in :row: of :table:. a :to_find: of
+        None checks for NULL.
         """
-        op = ' = '
-        if to_find == 'NULL':
-            op = ' IS '
-
-        return bool(await self.execute('SELECT ' + row + ' FROM ' + table +
-                                       ' WHERE ' + row + op + to_find + ';',
-                                       True))
+        if to_find is None:
+            return bool(await self.execute(
+                _select_sql(table, (row,), row + ' IS NULL LIMIT 1'),
+                return_results=True))
+        return bool(await self.execute(
+            _select_sql(table, (row,), row + ' = %s LIMIT 1'), (to_find,),
+            return_results=True))
         # execute returns a list, if list is empty know not in table so false
 
     async def get_columns_values(self, table: str, columns: List[str]) -> \
             List[tuple]:
         """ query and return all values from :table: under :column(s):
         """
-        command = 'SELECT '
-        for item in columns:
-            command += item + ', '
-        command = command[:-2] + ' FROM ' + table + ';'
+        return await self.execute(_select_sql(table, tuple(columns)),
+                                  return_results=True)
 
-        return await self.execute(command, return_results=True)
+    def stream_values(self, table: str, columns: List[str], condition='',
+                      params=()):
+        """ async iterator over :columns: of the rows of :table: where
+        :condition: is met, or every row if it is empty. see stream.
+        """
+        return self.stream(_select_sql(table, tuple(columns), condition),
+                           params)
 
-    async def get_values(self, table: str, column: str, condition: str):
+    async def get_values(self, table: str, column: str, condition: str,
+                         params=()):
         """ query and return specific values from :table: under :column: where
-        :condition: is met
+        :condition: is met, with :params: bound to its %s placeholders.
         precondition: :condition: follows proper MySQL syntax
         """
-        command = 'SELECT ' + column + ' FROM ' + table + ' WHERE ' + condition
-        return await self.execute(command, return_results=True)
+        columns = tuple(c.strip() for c in column.split(','))
+        return await self.execute(_select_sql(table, columns, condition),
+                                  params, return_results=True)
 
-    async def insert(self,  table: str, columns: List[str], items: List[str]) -> None:
+    async def insert(self,  table: str, columns: List[str], items: list) -> None:
         """ insert items into :table: where elements from :items: go to the
         column with the same index in :columns:.
         precondition: len(items) == len(columns)
         """
-        command = 'INSERT INTO ' + table + ' ('
+        await self.execute(_insert_sql(table, tuple(columns), 1), items)
 
-        for item in columns:
-            command += item + ', '
+    async def insert_ignore(self, table: str, columns: List[str],
+                            items: list) -> bool:
+        """ insert items into :table: like insert, unless a row with the same
+        key already exists. return whether the row was inserted.
+        """
+        inserted, _ = await self.execute_write(
+            _insert_sql(table, tuple(columns), 1, ignore=True), items)
+        return inserted > 0
+
+    async def upsert(self, table: str, columns: List[str], items: list,
+                     update_columns: List[str]) -> None:
+        """ insert items into :table: like insert, or if a row with the same
+        key already exists set its :update_columns: to the new values instead.
+        precondition: every column of :update_columns: is in :columns:
+        """
+        for column in update_columns:
+            _check_identifier(column)
+        suffix = 'ON DUPLICATE KEY UPDATE ' + ', '.join(
+            column + ' = VALUES(' + column + ')' for column in update_columns)
+        await self.execute(_insert_sql(table, tuple(columns), 1, suffix),
+                           items)
+
+    async def update(self, table: str, columns: List[str], values: list,
+                     update_condition: str, params=()) -> None:
+        """ updates the columns in :columns: from :table:, with the elements of
+        :values: of the same index, if :update_condition: is met. :params: are
+        bound to the %s placeholders of :update_condition:.
+        precondition: len(columns) == len(values) and update_condition is
+        correct MySQL syntax (column = %s)
+        """
+        await self.execute(_update_sql(table, tuple(columns), update_condition),
+                           list(values) + list(params))
 
-        command = command[:-2] + ') VALUES ('
+    async def delete(self, table: str, delete_condition: str, params=()):
+        """ deletes values from :table: where :delete_condition: is met, with
+        :params: bound to its %s placeholders.
+        precondition: :delete_condition: is proper MySQL syntax
+        """
+        await self.execute(_delete_sql(table, delete_condition), params)
+
+    async def insert_many(self, table: str, columns: List[str], rows: list,
+                          ignore=False, update_columns=()) -> int:
+        """ insert every row of :rows: into :table:, where elements of a row go
+        to the column with the same index in :columns:. rows are written up to
+        _chunk_size per statement. existing rows are skipped if :ignore:, or
+        have their :update_columns: set to the new values if any are given.
+        return the number of rows changed as counted by MySQL.
+        precondition: every row has len(columns) elements
+        """
+        suffix = ''
+        if update_columns:
+            for column in update_columns:
+                _check_identifier(column)
+            suffix = 'ON DUPLICATE KEY UPDATE ' + ', '.join(
+                column + ' = VALUES(' + column + ')'
+                for column in update_columns)
+        changed = 0
+        for chunk in _chunks(rows, self._chunk_size):
+            params = [value for row in chunk for value in row]
+            count, _ = await self.execute_write(
+                _insert_sql(table, tuple(columns), len(chunk), suffix, ignore),
+                params)
+            changed += count
+        return changed
+
+    async def delete_many(self, table: str, column: str, values: list,
+                          delete_condition='', params=()) -> int:
+        """ deletes the rows of :table: whose :column: is in :values:, up to
+        _chunk_size values per statement. if :delete_condition: is given rows
+        must also meet it, with :params: bound to its %s placeholders. return
+        the number of rows deleted.
+        """
+        _check_identifier(table)
+        _check_identifier(column)
+        deleted = 0
+        for chunk in _chunks(values, self._chunk_size):
+            # IN lists are built fresh, caching a template per length would
+            # fill the statement caches with one huge string per length
+            command = 'DELETE FROM ' + table + ' WHERE ' + column + ' IN (' + \
+                      placeholders(len(chunk)) + ')'
+            if delete_condition:
+                command += ' AND ' + delete_condition.rstrip(';')
+            count, _ = await self.execute_write(command + ';',
+                                                list(chunk) + list(params))
+            deleted += count
+        return deleted
+
+    async def get_values_in(self, table: str, columns: List[str], column: str,
+                            values: list, suffix='') -> List[tuple]:
+        """ query and return :columns: of the rows of :table: whose :column:
+        is in :values:, querying up to _chunk_size values at a time. :suffix:,
+        such as an ORDER BY, is added to the query of every chunk.
+        """
+        _check_identifier(table)
+        for name in list(columns) + [column]:
+            _check_identifier(name)
+        rows = []
+        for chunk in _chunks(values, self._chunk_size):
+            command = 'SELECT ' + ', '.join(columns) + ' FROM ' + table + \
+                      ' WHERE ' + column + ' IN (' + \
+                      placeholders(len(chunk)) + ')'
+            if suffix:
+                command += ' ' + suffix
+            rows += await self.execute(command + ';', chunk,
+                                       return_results=True)
+        return rows
+
+    async def delete_returning(self, table: str, delete_condition: str,
+                               params=()) -> int:
+        """ deletes values from :table: like delete, return the number of rows
+        deleted.
+        """
+        deleted, _ = await self.execute_write(
+            _delete_sql(table, delete_condition), params)
+        return deleted
 
-        for item in items:
-            command += item + ', '
 
-        command = command[:-2] + ');'
-        await self.execute(command)
+def placeholders(count: int) -> str:
+    """ return :count: comma separated %s placeholders, for IN (...) lists.
+    """
+    return ', '.join(['%s'] * count)
 
-    async def update(self, table: str, columns: List[str], values: [str],
-                     update_condition: str) -> None:
-        """ updates the columns in :columns: from :table:, with the elements of
-        :values: of the same index, if :update_condition: is met.
-        precondition: len(columns) == len(values) and update_condition is
-        correct MySQL syntax (column = value)
-        """
-        command = 'UPDATE ' + table + ' SET '
 
-        for i in range(len(columns)):
-            command += columns[i] + ' = ' + values[i] + ', '
+def _chunks(items: list, size: int) -> list:
+    """ return :items: split into lists of at most :size: items.
+    """
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
 
-        command = command[:-2] + ' WHERE ' + update_condition + ';'
-        await self.execute(command)
 
-    async def delete(self, table: str, delete_condition: str):
-        """ deletes values from :table: where :delete_condition: is met
-        precondition: :delete_condition: is proper MySQL syntax
-        """
-        command = 'DELETE FROM ' + table + ' WHERE ' + delete_condition + ';'
-        await self.execute(command)
+def _check_identifier(name: str) -> None:
+    """ table and column names can't be bound as parameters, so make sure
+    they can't hold anything but a name.
+    """
+    if not _identifier.fullmatch(name):
+        raise ValueError('Invalid MySQL identifier: ' + name)
+
+
+# statement templates are built once per shape and reused, so hot queries
+# like is_banned don't rebuild their SQL on every call.
+@lru_cache(maxsize=512)
+def _select_sql(table: str, columns: tuple, condition='') -> str:
+    _check_identifier(table)
+    for column in columns:
+        _check_identifier(column)
+    command = 'SELECT ' + ', '.join(columns) + ' FROM ' + table
+    if condition:
+        command += ' WHERE ' + condition.rstrip(';')
+    return command + ';'
+
+
+@lru_cache(maxsize=512)
+def _insert_sql(table: str, columns: tuple, rows: int, suffix='',
+                ignore=False) -> str:
+    _check_identifier(table)
+    for column in columns:
+        _check_identifier(column)
+    row = '(' + placeholders(len(columns)) + ')'
+    command = ('INSERT IGNORE INTO ' if ignore else 'INSERT INTO ') + table + ' (' + ', '.join(columns) + \
+              ') VALUES ' + ', '.join([row] * rows)
+    if suffix:
+        command += ' ' + suffix
+    return command + ';'
+
+
+@lru_cache(maxsize=512)
+def _update_sql(table: str, columns: tuple, condition: str) -> str:
+    _check_identifier(table)
+    for column in columns:
+        _check_identifier(column)
+    return 'UPDATE ' + table + ' SET ' + \
+           ', '.join(column + ' = %s' for column in columns) + \
+           ' WHERE ' + condition.rstrip(';') + ';'
+
+
+@lru_cache(maxsize=512)
+def _delete_sql(table: str, condition: str) -> str:
+    _check_identifier(table)
+    return 'DELETE FROM ' + table + ' WHERE ' + condition.rstrip(';') + ';'
 
 
 class GamesDatabase(_DatabaseInteraction):
+    """ Players and their credits. Credit changes go through a write behind
+    CreditLedger, so games never wait on MySQL to move credits.
 
-    def __init__(self):
+    === Public Attributes ===
+    ledger: CreditLedger holding the current credits of active players
+
+    === Private Attributes ===
+    _profiles: maps a player id known to have an account to the unix time of
+               their last daily, least used players are evicted
+
+    """
+
+    def __init__(self, ledger_path='credit_ledger.log', flush_interval=1.0,
+                 flush_size=500, player_cache_size=10000):
         self._table_name = 'players'
+        self._checkpoint_table_name = 'credit_ledger_checkpoint'
+        self.ledger = CreditLedger(self, ledger_path, flush_interval,
+                                   flush_size)
+        self._profiles = LRUCache(maxsize=player_cache_size)
 
     async def initialize(self):
         await super().initialize()
@@ -167,130 +390,428 @@ class GamesDatabase(_DatabaseInteraction):
                                 ['Player_ID BIGINT',
                                  'Credits INT',
                                  'Daily_Reset BIGINT'])
+        await self.create_table(self._checkpoint_table_name,
+                                ['Id TINYINT PRIMARY KEY',
+                                 'Seq BIGINT NOT NULL'])
 
-    async def create_player(self, player_id: str):
+    async def start_ledger(self) -> None:
+        """ recovers credits left in the ledger's log by a crash and starts
+        flushing it. run after the players table is migrated.
+        """
+        await self.ledger.start()
+
+    async def close(self) -> None:
+        """ flushes every credit change still waiting in the ledger.
+        """
+        await self.ledger.close()
+
+    async def create_player(self, player_id: str) -> bool:
+        """ creates an account for the player, return whether one was created.
+        False if they already had one.
+        """
         columns = ['Player_ID', 'Credits', 'Daily_Reset']
-        items = [player_id, '10', str(int(time()))]
-        await self.insert(self._table_name, columns, items)
+        items = [player_id, 10, int(time())]
+        if not await self.insert_ignore(self._table_name, columns, items):
+            return False
+        self._profiles.set(player_id, items[2])
+        self.ledger.seed(player_id, items[1], self.ledger.epoch)
+        return True
 
-    async def add_player_credits(self, player_id: str, creds: int):
-        creds = await self.get_player_credits(player_id) + creds
-        await self.update(self._table_name, ['Credits'], [str(creds)],
-                          'Player_ID = ' + player_id)
+    async def ensure_player(self, player_id: str) -> bool:
+        """ makes sure the player has an account, return whether one had to
+        be created. players already cached need no query at all.
+        """
+        if player_id in self._profiles:
+            return False
+        # most misses are existing players after a restart, one SELECT loads
+        # them. only a player with no row pays for the INSERT IGNORE
+        if await self._load_player(player_id):
+            return False
+        if await self.create_player(player_id):
+            return True
+        # another command made the account between the two statements
+        await self._load_player(player_id)
+        return False
+
+    async def _load_player(self, player_id: str) -> bool:
+        """ caches the credits and daily of the player with one query, return
+        whether they have an account.
+        """
+        epoch = self.ledger.epoch
+        rows = await self.get_values(self._table_name, 'Credits, Daily_Reset',
+                                     'Player_ID = %s', (player_id,))
+        if not rows:
+            return False
+        self.ledger.seed(player_id, int(rows[0][0]), epoch)
+        self._profiles.set(player_id, int(rows[0][1]))
+        return True
+
+    def player_cache_stats(self) -> dict:
+        return self._profiles.stats()
+
+    async def add_player_credits(self, player_id: str, creds: int,
+                                 floor: Optional[int] = None) -> Optional[int]:
+        """ atomically adds :creds: to the players credits and return their
+        new balance. if :floor: is given the credits are only changed if the
+        balance would stay at or above it, otherwise nothing changes and None
+        is returned.
+        """
+        return await self.ledger.add(player_id, creds, floor)
 
-    async def update_player_daily(self, player_id: str):
-        await self.update(self._table_name, ['Daily_Reset'],
-                          [str(int(time()))], 'Player_ID = ' + player_id)
+    async def take_player_credits(self, player_id: str, creds: int) -> \
+            Optional[int]:
+        """ atomically takes :creds: from the player if they have that many,
+        return their new balance or None if they didn't have enough.
+        """
+        return await self.add_player_credits(player_id, -creds, floor=0)
+
+    async def apply_credit_changes(self, changes: Dict[str, int],
+                                   seq: int) -> None:
+        """ adds the credits of :changes: to each player in one statement and
+        records :seq: as the last ledger entry applied, in one transaction.
+        """
+        cases = ' '.join(['WHEN %s THEN %s'] * len(changes))
+        params = []
+        for player_id, creds in changes.items():
+            params += [player_id, creds]
+        params += list(changes)
+        await self.execute_transaction([
+            ('UPDATE ' + self._table_name + ' SET Credits = Credits + CASE '
+             'Player_ID ' + cases + ' END WHERE Player_ID IN (' +
+             placeholders(len(changes)) + ');', params),
+            (_insert_sql(self._checkpoint_table_name, ('Id', 'Seq'), 1,
+                         'ON DUPLICATE KEY UPDATE Seq = VALUES(Seq)'),
+             [1, seq])
+        ])
+
+    async def get_ledger_checkpoint(self) -> int:
+        """ return the last ledger entry applied to the players table.
+        """
+        seq = await self.get_values(self._checkpoint_table_name, 'Seq',
+                                    'Id = 1')
+        return int(seq[0][0]) if seq else 0
+
+    async def claim_player_daily(self, player_id: str,
+                                 cooldown=86400) -> bool:
+        """ atomically resets the players daily if :cooldown: seconds have
+        passed since their last one, return whether it was reset.
+        """
+        now = int(time())
+        last = self._profiles.get(player_id)
+        if last is not None and last > now - cooldown:
+            return False  # still cooling down, no need to ask the database
+        changed, _ = await self.execute_write(
+            'UPDATE ' + self._table_name + ' SET Daily_Reset = %s'
+            ' WHERE Player_ID = %s AND Daily_Reset <= %s;',
+            (now, player_id, now - cooldown))
+        if changed:
+            self._profiles.set(player_id, now)
+        return bool(changed)
 
     async def get_player_credits(self, player_id: str) -> int:
+        return await self.ledger.balance(player_id)
+
+    async def load_player_credits(self, player_id: str) -> int:
+        """ return the players credits as stored, without the changes still
+        waiting in the ledger.
+        """
         creds = await self.get_values(self._table_name, 'Credits',
-                                      'Player_ID = ' + player_id)
+                                      'Player_ID = %s', (player_id,))
         return int(creds[0][0])
 
+    async def get_top_players(self, player_ids: List[str], limit=10) -> \
+            List[Tuple[str, int]]:
+        """ return (player id, credits) of the :limit: players of :player_ids:
+        with the most credits, most first.
+        """
+        if not player_ids:
+            return []
+        await self.ledger.flush()  # so credits still in the ledger count
+        # one statement whatever the guild size, built without the template
+        # cache since every member count would cache a new huge string
+        rows = await self.execute(
+            'SELECT Player_ID, Credits FROM ' + self._table_name +
+            ' WHERE Player_ID IN (' + placeholders(len(player_ids)) +
+            ') ORDER BY Credits DESC LIMIT ' + str(int(limit)) + ';',
+            player_ids, return_results=True)
+        return [(str(player_id), int(creds)) for player_id, creds in rows]
+
     async def get_player_daily(self, player_id: str) -> int:
         """ returns unix time of player daily column
         """
-        time = await self.get_values(self._table_name, 'Daily_Reset',
-                                     'Player_ID = ' + player_id)
-        return int(time[0][0])
+        daily = self._profiles.get(player_id)
+        if daily is None:
+            if not await self._load_player(player_id):
+                raise IndexError('No player ' + player_id)
+            daily = self._profiles.get(player_id)
+        return daily
 
     async def player_exists(self, player_id: str) -> bool:
-        return await self.in_table(self._table_name, 'Player_ID', player_id)
+        if player_id in self._profiles:
+            return True
+        return await self._load_player(player_id)
 
 
 class StreamerDatabase(_DatabaseInteraction):
 
+    def __init__(self):
+        self._streamers_table_name = 'guild_streamers'
+        self._games_table_name = 'twitch_games'
+        self._users_table_name = 'twitch_users'
+        self._live_table_name = 'twitch_live_state'
+        self._go_live_table_name = 'twitch_go_live'
+
+    async def initialize(self):
+        await super().initialize()
+        await self.create_table(self._streamers_table_name,
+                                ['Guild_ID BIGINT',
+                                 'Streamer_login VARCHAR(255)',
+                                 'PRIMARY KEY (Guild_ID, Streamer_login)',
+                                 'INDEX (Streamer_login)'])
+        await self.create_table(self._games_table_name,
+                                ['Game_ID VARCHAR(32) PRIMARY KEY',
+                                 'Name VARCHAR(255)'])
+        await self.create_table(self._users_table_name,
+                                ['Streamer_login VARCHAR(255) PRIMARY KEY',
+                                 'User_ID VARCHAR(32)',
+                                 'Display_Name VARCHAR(255)',
+                                 'Validated_At BIGINT'])
+        await self.create_table(self._live_table_name,
+                                ['Streamer_login VARCHAR(255) PRIMARY KEY',
+                                 'Is_Live BOOLEAN',
+                                 'Changed_At BIGINT'])
+        await self.create_table(self._go_live_table_name,
+                                ['Streamer_login VARCHAR(255)',
+                                 'Went_Live_At BIGINT',
+                                 'PRIMARY KEY (Streamer_login, Went_Live_At)',
+                                 'INDEX (Went_Live_At)'])
+
     async def add_new_streamer(self, guild_id: str, streamer_login: str):
-        """ Adds streamer_login to the streamer table corresponding to
-        :guild_id:
+        """ Adds streamer_login to the streamers of :guild_id:
+        """
+        await self.insert_ignore(self._streamers_table_name,
+                                 ['Guild_ID', 'Streamer_login'],
+                                 [guild_id, streamer_login])
+
+    async def add_new_streamers(self, guild_id: str,
+                                streamer_logins: List[str]) -> int:
+        """ Adds every login of :streamer_logins: to the streamers of
+        :guild_id:, return how many weren't already added.
         """
-        guild_table = StreamerDatabase._guild_table_name(guild_id)
-        await self.insert(guild_table,
-                          ['Streamer_login', ],
-                          ['\'' + streamer_login + '\''])
+        return await self.insert_many(self._streamers_table_name,
+                                      ['Guild_ID', 'Streamer_login'],
+                                      [(guild_id, login)
+                                       for login in streamer_logins],
+                                      ignore=True)
 
     async def remove_streamer(self, guild_id: str, streamer_login: str):
-        """ Removes streamer_login from the streamer table corresponding to
-        :guild_id:
+        """ Removes streamer_login from the streamers of :guild_id:
         """
-        guild_table = StreamerDatabase._guild_table_name(guild_id)
-        await self.delete(guild_table,
-                          'Streamer_login = \'' + streamer_login + '\'')
+        await self.delete(self._streamers_table_name,
+                          'Guild_ID = %s AND Streamer_login = %s',
+                          (guild_id, streamer_login))
 
     async def get_streamers(self, guild_id: str) -> list:
-        """ return list of all streamers in streamer table corresponding to
-        :guild_id:
+        """ return list of all streamers of :guild_id:
+        """
+        return [row[0] async for row in self.stream_values(
+            self._streamers_table_name, ['Streamer_login'], 'Guild_ID = %s',
+            (guild_id,))]
+
+    async def get_subscriptions(self, guild_ids: List[str]) -> \
+            Dict[str, List[str]]:
+        """ return a dict mapping every lowercase streamer login followed by
+        a guild in :guild_ids: to the ids of the guilds following them.
+        """
+        guild_ids = set(guild_ids)
+        subscriptions = {}
+        async for gid, streamer in self.stream_values(
+                self._streamers_table_name, ['Guild_ID', 'Streamer_login']):
+            gid = str(gid)
+            if gid in guild_ids:
+                subscriptions.setdefault(streamer.lower(), []).append(gid)
+        return subscriptions
+
+    async def get_game_names(self, game_ids: List[str]) -> Dict[str, str]:
+        """ return a dict of game id to game name for every id in
+        :game_ids: that has been saved.
+        """
+        rows = await self.get_values_in(self._games_table_name,
+                                        ['Game_ID', 'Name'], 'Game_ID',
+                                        game_ids)
+        return {row[0]: row[1] for row in rows}
+
+    async def save_game_names(self, games: Dict[str, str]) -> None:
+        """ saves the game id to game name pairs in :games:, replacing the
+        name of ids already saved.
+        """
+        await self.insert_many(self._games_table_name, ['Game_ID', 'Name'],
+                               list(games.items()), update_columns=['Name'])
+
+    async def save_twitch_users(self, users: List[Tuple[str, str, str]]) \
+            -> None:
+        """ saves every (login, user id, display name) tuple in :users: as
+        validated now, replacing what was saved for logins already saved.
         """
-        guild_table = StreamerDatabase._guild_table_name(guild_id)
-        streams = await self.get_columns_values(guild_table, ['Streamer_login'])
-        streamers = []
-        for item in streams:
-            streamers.append(item[0])
-        return streamers
+        now = int(time())
+        await self.insert_many(
+            self._users_table_name,
+            ['Streamer_login', 'User_ID', 'Display_Name', 'Validated_At'],
+            [(login.lower(), user_id, display_name, now)
+             for login, user_id, display_name in users],
+            update_columns=['User_ID', 'Display_Name', 'Validated_At'])
+
+    async def get_twitch_users(self, logins: List[str]) -> \
+            Dict[str, Tuple[str, str, int]]:
+        """ return a dict mapping every saved login in :logins: to a tuple of
+        (user id, display name, unix time last validated).
+        """
+        rows = await self.get_values_in(
+            self._users_table_name,
+            ['Streamer_login', 'User_ID', 'Display_Name', 'Validated_At'],
+            'Streamer_login', [login.lower() for login in logins])
+        return {row[0]: (row[1], row[2], int(row[3])) for row in rows}
+
+    async def remove_twitch_users(self, logins: List[str]) -> None:
+        """ forgets the saved twitch users of :logins:, so they are
+        validated again the next time they are checked.
+        """
+        await self.delete_many(self._users_table_name, 'Streamer_login',
+                               [login.lower() for login in logins])
+
+    async def get_live_states(self) -> Dict[str, bool]:
+        """ return a dict mapping every saved streamer login to whether they
+        were live on the last check.
+        """
+        return {login: bool(is_live)
+                async for login, is_live in self.stream_values(
+                    self._live_table_name, ['Streamer_login', 'Is_Live'])}
+
+    async def save_live_states(self, states: Dict[str, bool]) -> None:
+        """ saves whether each streamer login in :states: is live, as having
+        changed now.
+        """
+        now = int(time())
+        await self.insert_many(
+            self._live_table_name, ['Streamer_login', 'Is_Live', 'Changed_At'],
+            [(login, is_live, now) for login, is_live in states.items()],
+            update_columns=['Is_Live', 'Changed_At'])
+
+    async def get_go_live_history(self, since: int) -> Dict[str, List[int]]:
+        """ return a dict mapping every streamer login that went live at or
+        after the unix time :since: to the times they did, oldest first.
+        """
+        history = {}
+        async for login, went_live in self.stream_values(
+                self._go_live_table_name, ['Streamer_login', 'Went_Live_At'],
+                'Went_Live_At >= %s ORDER BY Streamer_login, Went_Live_At',
+                (since,)):
+            history.setdefault(login, []).append(int(went_live))
+        return history
+
+    async def save_go_live_times(self, times: List[Tuple[str, int]]) -> None:
+        """ saves every (login, unix time) tuple in :times: as a time that
+        streamer went live.
+        """
+        await self.insert_many(self._go_live_table_name,
+                               ['Streamer_login', 'Went_Live_At'],
+                               times, ignore=True)
 
-    @staticmethod
-    def _guild_table_name(guild_id: str) -> str:
-        return 'g' + guild_id + '_streamers'
+    async def remove_go_live_times(self, before: int) -> None:
+        """ forgets every go live time older than the unix time :before:.
+        """
+        await self.delete(self._go_live_table_name, 'Went_Live_At < %s',
+                          (before,))
 
 
 class ServerManageDatabase(_DatabaseInteraction):
 
-    def __init__(self):
+    def __init__(self, ban_cache_size=1000):
         self._announce_table_name = 'announce_chnl'
+        self._bans_table_name = 'guild_bans'
+        # maps a guild id to the set of user ids banned in it, so the global
+        # ban check rarely needs the database. least used guilds are evicted
+        self._bans = LRUCache(maxsize=ban_cache_size)
+        # maps a guild id to a counter bumped on every change to its bans, so
+        # a load that overlapped a change is not cached
+        self._ban_versions = {}
+        # maps a guild id to its GuildSettings, every guild is loaded at once
+        # by load_guild_settings and kept up to date as settings change
+        self._settings = {}
 
     async def initialize(self):
         await super().initialize()
         await self.create_table(self._announce_table_name,
                                 ['Guild_ID BIGINT', 'Announcement_ID BIGINT'])
+        await self.create_table(self._bans_table_name,
+                                ['Guild_ID BIGINT', 'User_ID BIGINT',
+                                 'PRIMARY KEY (Guild_ID, User_ID)'])
 
-    async def check_new_guilds(self, guilds: list):
-        """ Check if any guilds were added while bot was offline, and creates
-        tables for guilds that added the bot.
+    async def check_new_guilds(self, guilds: list) -> int:
+        """ Check if any guilds were added while bot was offline, and sets
+        up guilds that added the bot. return the number of guilds set up.
         """
-        tables = await self.execute('show tables;', return_results=True)
+        await self.load_guild_settings()
 
-        for g in guilds:
-            is_new = True
-            gid = str(g.id)
-            for table in tables:
-                if gid in table[0]:
-                    is_new = False
-                    break
-            if is_new:
-                await self.add_new_guild(g)
+        new_guilds = [g for g in guilds if str(g.id) not in self._settings]
+        await self.add_new_guilds(new_guilds)
+        return len(new_guilds)
+
+    async def load_guild_settings(self) -> None:
+        """ loads the settings of every guild in one query.
+        """
+        self._settings = {
+            str(gid): GuildSettings(str(gid),
+                                    str(chnl) if chnl is not None else None)
+            async for gid, chnl in self.stream_values(
+                self._announce_table_name, ['Guild_ID', 'Announcement_ID'])}
+
+    async def get_guild_settings(self, guild_id: str) -> GuildSettings:
+        """ return the settings of :guild_id:, only querying the database for
+        a guild load_guild_settings didn't find.
+        """
+        settings = self._settings.get(guild_id)
+        if settings is None:
+            rows = await self.get_values(self._announce_table_name,
+                                         'Announcement_ID',
+                                         'Guild_ID = %s', (guild_id,))
+            if not rows:
+                return GuildSettings(guild_id)  # not set up, nothing to cache
+            chnl = rows[0][0]
+            settings = GuildSettings(guild_id,
+                                     str(chnl) if chnl is not None else None)
+            self._settings[guild_id] = settings
+        return settings
 
     async def add_new_guild(self, guild):
-        """ Creates tables for :guild:
+        """ Sets up :guild: with a default announcement channel
         """
-        gid = str(guild.id)
-        await self.create_table('g' + gid + '_streamers',
-                                ['Streamer_login VARCHAR(255)'])
-        await self.create_table('g' + gid + '_bannedusers', ['User_ID BIGINT'])
+        await self.add_new_guilds([guild])
 
-        announce_chnl = self._get_default_announce_chnl(guild)
-        await self.set_announcement_channel(gid, announce_chnl)
+    async def add_new_guilds(self, guilds: list) -> None:
+        """ Sets up every guild of :guilds: with a default announcement
+        channel, in as few statements as possible.
+        """
+        chnls = [(str(guild.id), self._get_default_announce_chnl(guild))
+                 for guild in guilds]
+        await self.insert_many(self._announce_table_name,
+                               ['Guild_ID', 'Announcement_ID'], chnls,
+                               update_columns=['Announcement_ID'])
+        for gid, chnl in chnls:
+            self._settings[gid] = GuildSettings(gid, chnl)
 
-    async def get_announcement_chnl(self, guild_id: str) -> str:
-        chnl_id = await self.get_values(self._announce_table_name,
-                                        'Announcement_ID',
-                                        'Guild_ID = ' + guild_id)
-        return chnl_id[0][0]
+    async def get_announcement_chnl(self, guild_id: str) -> Optional[str]:
+        return (await self.get_guild_settings(guild_id)).announcement_chnl
 
     async def set_announcement_channel(self, guild_id: str,
                                        announcement_chnl_id: str):
-        to_replace = await self.get_values(self._announce_table_name,
-                                           'Announcement_ID',
-                                           'Guild_ID = ' + guild_id)
-
-        if to_replace:
-            await self.update(self._announce_table_name,
-                              ['Announcement_ID'],
-                              [announcement_chnl_id],
-                              'Guild_ID = ' + guild_id)
-        else:
-            await self.insert(self._announce_table_name,
-                              ['Guild_ID', 'Announcement_ID'],
-                              [guild_id, announcement_chnl_id])
+        await self.upsert(self._announce_table_name,
+                          ['Guild_ID', 'Announcement_ID'],
+                          [guild_id, announcement_chnl_id],
+                          ['Announcement_ID'])
+        settings = self._settings.setdefault(guild_id,
+                                             GuildSettings(guild_id))
+        settings.announcement_chnl = str(announcement_chnl_id)
 
     def _get_default_announce_chnl(self, guild) -> str:
         if guild.system_channel:
@@ -312,45 +833,80 @@ class ServerManageDatabase(_DatabaseInteraction):
     async def block_user(self, user_id: str, guild_id: str) -> bool:
         """ return whether user_id was successfully blocked in :guild_id:
         """
-        if await self.is_banned(user_id, guild_id):
-            # user in table, cant ban.
-            return False
-        else:
-            guild_banned_table = ServerManageDatabase._banned_table(guild_id)
-            await self.insert(guild_banned_table, ['User_ID'], [user_id])
-            return True
+        if not await self.insert_ignore(self._bans_table_name,
+                                        ['Guild_ID', 'User_ID'],
+                                        [guild_id, user_id]):
+            return False  # user in table, cant ban.
+        self._bans_changed(guild_id, added=[user_id])
+        return True
+
+    async def block_users(self, user_ids: List[str], guild_id: str) -> int:
+        """ blocks every user of :user_ids: in :guild_id:, return how many
+        weren't already blocked.
+        """
+        blocked = await self.insert_many(self._bans_table_name,
+                                         ['Guild_ID', 'User_ID'],
+                                         [(guild_id, user_id)
+                                          for user_id in user_ids],
+                                         ignore=True)
+        self._bans_changed(guild_id, added=user_ids)
+        return blocked
 
     async def unblock_user(self, user_id: str, guild_id: str) -> bool:
         """ return whether :user_id: was successfully unblocked in :guild_id:
         """
-        if await self.is_banned(user_id, guild_id):
-            guild_banned_table = ServerManageDatabase._banned_table(guild_id)
-            await self.delete(guild_banned_table, 'User_ID = ' + user_id)
-            return True
-        else:  # user in table, cant ban.
-            return False
+        if not await self.delete_returning(self._bans_table_name,
+                                           'Guild_ID = %s AND User_ID = %s',
+                                           (guild_id, user_id)):
+            return False  # user not in table, cant unban.
+        self._bans_changed(guild_id, removed=[user_id])
+        return True
+
+    def forget_bans(self, guild_id: str) -> None:
+        """ drops the cached bans of :guild_id:, for when its bans were changed
+        outside this class. they are loaded again on the next check.
+        """
+        self._bans.pop(guild_id)
+        self._ban_versions[guild_id] = self._ban_versions.get(guild_id, 0) + 1
+
+    def _bans_changed(self, guild_id: str, added=(), removed=()) -> None:
+        """ writes a change to the bans of :guild_id: through to the cache.
+        uncached guilds load the change when next checked.
+        """
+        self._ban_versions[guild_id] = self._ban_versions.get(guild_id, 0) + 1
+        bans = self._bans.get(guild_id)
+        if bans is not None:
+            bans.update(added)
+            bans.difference_update(removed)
 
     async def get_banned_user_ids(self, guild_id: str) -> list:
-        """ return list of all members id in bannedusers table corresponding to
-        :guild_id:
+        """ return list of all members id banned in :guild_id:
         """
-        guild_banned_table = ServerManageDatabase._banned_table(guild_id)
-        ids = await self.get_columns_values(guild_banned_table, ['User_ID'])
-        member_ids = []
-        for item in ids:
-            member_ids.append(item[0])
-        return member_ids
+        return [row[0] async for row in self.stream_values(
+            self._bans_table_name, ['User_ID'], 'Guild_ID = %s', (guild_id,))]
 
     async def is_banned(self, user_id: str, guild_id: str) -> bool:
         """ return whether :user_id: is banned in :guild_id:
         """
-        guild_banned_table = ServerManageDatabase._banned_table(guild_id)
-        return await self.in_table(guild_banned_table, 'User_ID', user_id)
-
-    @staticmethod
-    def _banned_table(guild_id: str) -> str:
-        return 'g' + guild_id + '_bannedusers'
-
+        return user_id in await self._cached_bans(guild_id)
 
+    def guild_settings_stats(self) -> dict:
+        return {'guilds': len(self._settings)}
 
+    def ban_cache_stats(self) -> dict:
+        return self._bans.stats()
 
+    async def _cached_bans(self, guild_id: str) -> set:
+        """ return the set of user ids banned in :guild_id:, loading all of
+        them in one query if the guild isn't cached.
+        """
+        bans = self._bans.get(guild_id)
+        if bans is None:
+            version = self._ban_versions.get(guild_id, 0)
+            bans = {str(row[0]) async for row in self.stream_values(
+                self._bans_table_name, ['User_ID'], 'Guild_ID = %s',
+                (guild_id,))}
+            # bans changed while loading may be missing, use them only once
+            if self._ban_versions.get(guild_id, 0) == version:
+                self._bans.set(guild_id, bans)
+        return bans
@@ -0,0 +1,128 @@
+import aiomysql
+import asyncio
+import config
+from contextlib import asynccontextmanager
+from time import monotonic
+
+
+class ConnectionPool:
+    """ The one pool of MySQL connections shared by every database class, so
+    startup makes one bootstrap connection and the bot as a whole never holds
+    more than maxsize connections.
+
+    === Public Attributes ===
+    minsize: number of connections opened at startup and kept open
+    maxsize: max number of connections open at once
+
+    === Private Attributes ===
+    _pool: the aiomysql pool, None until initialized
+    _lock: held while initializing so concurrent callers share one setup
+    _in_use: number of connections currently acquired
+    _peak_in_use: most connections acquired at once
+    _acquisitions: number of times a connection was acquired
+    _total_wait: seconds spent waiting for connections in total
+    _max_wait: longest seconds spent waiting for a connection
+
+    """
+
+    def __init__(self, minsize=1, maxsize=10):
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self._pool = None
+        self._lock = None
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._acquisitions = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    async def initialize(self) -> None:
+        """ creates the database if needed and opens the pool, doing nothing
+        if it is already open.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._pool is not None:
+                return
+
+            initial_conn = await aiomysql.connect(
+                host=config.mysql_host,
+                port=config.mysql_port,
+                user=config.mysql_user,
+                password=config.mysql_password,
+                autocommit=True
+            )
+            async with initial_conn.cursor() as cur:
+                await cur.execute('CREATE DATABASE IF NOT EXISTS ' +
+                                  config.mysql_database_name + ';')
+            initial_conn.close()
+
+            self._pool = await aiomysql.create_pool(
+                host=config.mysql_host,
+                port=config.mysql_port,
+                user=config.mysql_user,
+                password=config.mysql_password,
+                autocommit=True,
+                db=config.mysql_database_name,
+                minsize=self.minsize,
+                maxsize=self.maxsize
+            )
+            await self._prewarm()
+
+    @asynccontextmanager
+    async def acquire(self):
+        """ async context manager lending out a connection from the pool,
+        keeping track of how long callers wait for one.
+        """
+        start = monotonic()
+        async with self._pool.acquire() as conn:
+            wait = monotonic() - start
+            self._acquisitions += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            try:
+                yield conn
+            finally:
+                self._in_use -= 1
+
+    def stats(self) -> dict:
+        """ return pool utilisation and wait time statistics.
+        """
+        avg_wait = self._total_wait / self._acquisitions \
+            if self._acquisitions else 0.0
+        return {
+            'minsize': self.minsize,
+            'maxsize': self.maxsize,
+            'open': self._pool.size if self._pool is not None else 0,
+            'free': self._pool.freesize if self._pool is not None else 0,
+            'in_use': self._in_use,
+            'peak_in_use': self._peak_in_use,
+            'acquisitions': self._acquisitions,
+            'avg_wait_ms': round(avg_wait * 1000, 2),
+            'max_wait_ms': round(self._max_wait * 1000, 2)
+        }
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+    async def _prewarm(self) -> None:
+        """ checks out minsize connections at once and pings them, so they are
+        open and usable before the first command needs one.
+        """
+        async def ping():
+            async with self._pool.acquire() as conn:
+                await conn.ping()
+
+        await asyncio.gather(*(ping() for _ in range(self.minsize)))
+
+
+connection_pool = ConnectionPool(
+    minsize=getattr(config, 'mysql_pool_minsize', 1),
+    maxsize=getattr(config, 'mysql_pool_maxsize', 10)
+)
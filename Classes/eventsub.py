@@ -0,0 +1,259 @@
+import asyncio
+import hashlib
+import hmac
+import json
+from aiohttp import web
+from datetime import datetime, timezone
+from Classes.concurrency import gather_bounded
+from Classes.exceptions import TwitchRequestError
+from Classes.lru_cache import LRUCache
+from Classes.twitch_streamer import TwitchStreamer
+
+
+class EventSubReceiver:
+    """ Small web server inside the bot that receives twitch EventSub webhook
+    callbacks, so go live announcements are pushed to us instead of polled.
+
+    === Public Attributes ===
+    host: interface the server listens on
+    port: port the server listens on
+    path: url path twitch sends callbacks to
+
+    === Private Attributes ===
+    _secret: secret twitch signs every callback with
+    _handlers: maps an event type like 'stream.online' to a coroutine
+               function called with the event of every notification of it
+    _seen: ids of recently handled messages, twitch may deliver one twice
+    _runner: runs the web app while the receiver is started
+    _max_age: seconds old a message may be before it is refused as a replay
+
+    """
+    _max_age = 600
+
+    def __init__(self, secret: str, handlers: dict, host='0.0.0.0',
+                 port=8080, path='/eventsub'):
+        self.host = host
+        self.port = port
+        self.path = path
+        self._secret = secret
+        self._handlers = handlers
+        self._seen = LRUCache(maxsize=10000, ttl=self._max_age)
+        self._runner = None
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """ answers a callback from twitch. notifications are handled in the
+        background so twitch gets its response straight away.
+        """
+        body = await request.read()
+        headers = request.headers
+        if not EventSubReceiver.verify(self._secret, headers, body):
+            return web.Response(status=403)
+
+        msg_id = headers['Twitch-Eventsub-Message-Id']
+        if msg_id in self._seen:
+            return web.Response(status=204)
+        self._seen.set(msg_id, True)
+
+        msg = json.loads(body)
+        msg_type = headers.get('Twitch-Eventsub-Message-Type')
+        if msg_type == 'webhook_callback_verification':
+            return web.Response(text=msg['challenge'])
+        elif msg_type == 'notification':
+            handler = self._handlers.get(msg['subscription']['type'])
+            if handler is not None:
+                asyncio.ensure_future(self._run_handler(handler, msg))
+        elif msg_type == 'revocation':
+            print('EventSub subscription revoked: ' +
+                  msg['subscription']['type'] + ' ' +
+                  msg['subscription']['status'])
+        return web.Response(status=204)
+
+    @staticmethod
+    async def _run_handler(handler, msg: dict) -> None:
+        try:
+            await handler(msg['event'])
+        except Exception as e:  # nothing awaits this task to see the error
+            print('EventSub ' + msg['subscription']['type'] +
+                  ' handler failed:', e, type(e))
+
+    @staticmethod
+    def verify(secret: str, headers, body: bytes) -> bool:
+        """ return whether :body: was signed by twitch with :secret:, and was
+        sent recently enough that it isn't a replayed message.
+        """
+        try:
+            msg_id = headers['Twitch-Eventsub-Message-Id']
+            timestamp = headers['Twitch-Eventsub-Message-Timestamp']
+            signature = headers['Twitch-Eventsub-Message-Signature']
+        except KeyError:
+            return False
+
+        expected = 'sha256=' + EventSubReceiver.sign(secret, msg_id,
+                                                      timestamp, body)
+        if not hmac.compare_digest(expected, signature):
+            return False
+
+        sent = EventSubReceiver._parse_timestamp(timestamp)
+        if sent is None:
+            return False
+        age = (datetime.now(timezone.utc) - sent).total_seconds()
+        return age <= EventSubReceiver._max_age
+
+    @staticmethod
+    def sign(secret: str, msg_id: str, timestamp: str, body: bytes) -> str:
+        msg = msg_id.encode() + timestamp.encode() + body
+        return hmac.new(secret.encode(), msg, hashlib.sha256).hexdigest()
+
+    @staticmethod
+    def _parse_timestamp(timestamp: str):
+        # twitch sends nanoseconds, which fromisoformat can't read
+        stamp = timestamp.rstrip('Z')
+        if '.' in stamp:
+            stamp, fraction = stamp.split('.', 1)
+            stamp += '.' + fraction[:6]
+        try:
+            return datetime.fromisoformat(stamp).replace(tzinfo=timezone.utc)
+        except ValueError:
+            return None
+
+
+class EventSubManager:
+    """ Keeps our EventSub subscriptions in line with the streamers guilds
+    want notifications for.
+
+    === Public Attributes ===
+    callback_url: public url twitch sends callbacks for our subscriptions to
+    event_types: the event types subscribed to for every streamer
+
+    === Private Attributes ===
+    _secret: secret twitch signs callbacks with
+
+    """
+    _url = 'https://api.twitch.tv/helix/eventsub/subscriptions'
+
+    def __init__(self, callback_url: str, secret: str,
+                 event_types=('stream.online', 'stream.offline')):
+        self.callback_url = callback_url
+        self.event_types = event_types
+        self._secret = secret
+
+    async def sync(self, user_ids: set) -> None:
+        """ subscribes to every event type for every id in :user_ids:, and
+        removes our subscriptions for anyone else or ones that failed. up to
+        TwitchStreamer.workers requests are sent at the same time.
+        """
+        wanted = {(event_type, user_id) for user_id in user_ids
+                  for event_type in self.event_types}
+        existing = {}
+        changes = []
+        for sub in await self.get_subscriptions():
+            key = (sub['type'], sub['condition'].get('broadcaster_user_id'))
+            if key in wanted and sub['status'] in ('enabled',
+                                                   'webhook_callback_verification_pending'):
+                existing[key] = sub['id']
+            else:
+                changes.append(self.delete_subscription(sub['id']))
+
+        for event_type, user_id in wanted - set(existing):
+            changes.append(self.create_subscription(event_type, user_id))
+        results = await gather_bounded(changes, TwitchStreamer.workers,
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):  # the next sync tries again
+                print('EventSub sync request failed:', result, type(result))
+
+    async def get_subscriptions(self) -> list:
+        """ return all subscriptions sending callbacks to callback_url.
+        """
+        subs = []
+        cursor = ''
+        while True:
+            url = self._url + ('?after=' + cursor if cursor else '')
+            resp = await TwitchStreamer.helix_request('GET', url)
+            if resp.status != 200 or resp.json is None or \
+                    'data' not in resp.json:
+                raise TwitchRequestError(url, resp.status)
+            subs.extend(sub for sub in resp.json['data']
+                        if sub['transport'].get('callback') == self.callback_url)
+            cursor = resp.json.get('pagination', {}).get('cursor')
+            if not cursor:
+                return subs
+
+    async def create_subscription(self, event_type: str, user_id: str) -> None:
+        body = {
+            'type': event_type,
+            'version': '1',
+            'condition': {'broadcaster_user_id': user_id},
+            'transport': {
+                'method': 'webhook',
+                'callback': self.callback_url,
+                'secret': self._secret
+            }
+        }
+        resp = await TwitchStreamer.helix_request('POST', self._url, json=body)
+        if resp.status not in (202, 409):  # 409 means it already exists
+            print('Could not subscribe to ' + event_type + ' for ' + user_id +
+                  ': ' + str(resp.json))
+
+    async def delete_subscription(self, sub_id: str) -> None:
+        await TwitchStreamer.helix_request('DELETE', self._url + '?id=' + sub_id)
+
+
+if __name__ == '__main__':
+    # fake EventSub sender, sends signed callbacks to a local receiver
+    from Classes.http_client import http_client
+
+    async def print_event(event):
+        print('received event:', event)
+
+    async def send(msg_type: str, msg: dict, secret: str) -> None:
+        body = json.dumps(msg).encode()
+        msg_id = str(id(msg))
+        timestamp = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+        headers = {
+            'Twitch-Eventsub-Message-Id': msg_id,
+            'Twitch-Eventsub-Message-Timestamp': timestamp,
+            'Twitch-Eventsub-Message-Type': msg_type,
+            'Twitch-Eventsub-Message-Signature':
+                'sha256=' + EventSubReceiver.sign(secret, msg_id, timestamp,
+                                                  body),
+            'Content-Type': 'application/json'
+        }
+        resp = await http_client.request('POST', 'http://127.0.0.1:8080/eventsub',
+                                         data=body, headers=headers)
+        print(msg_type, resp.status)
+
+    async def main():
+        receiver = EventSubReceiver('fake secret',
+                                    {'stream.online': print_event,
+                                     'stream.offline': print_event},
+                                    host='127.0.0.1')
+        await receiver.start()
+        sub = {'type': 'stream.online'}
+        await send('webhook_callback_verification',
+                   {'challenge': 'abc', 'subscription': sub}, 'fake secret')
+        await send('notification',
+                   {'subscription': sub,
+                    'event': {'broadcaster_user_id': '1',
+                              'broadcaster_user_login': 'uwumastertv',
+                              'broadcaster_user_name': 'uwumastertv'}},
+                   'fake secret')
+        await send('notification', {'subscription': sub, 'event': {}},
+                   'wrong secret')  # should be refused with 403
+        await asyncio.sleep(0.1)
+        await receiver.stop()
+        await http_client.close()
+
+    asyncio.get_event_loop().run_until_complete(main())
@@ -18,3 +18,10 @@ class TwitchAuthorizationError(Exception):
     def __init__(self):
         super().__init__("Error with Oauth authorization, "
                          "Check twitch credentials!")
+
+
+class TwitchRequestError(Exception):
+
+    def __init__(self, url: str, status: int):
+        super().__init__("Twitch request to " + url + " failed with status " +
+                         str(status) + ", giving up.")
@@ -0,0 +1,58 @@
+from Classes.lru_cache import LRUCache
+from typing import Dict, List
+
+
+class GameNameCache:
+    """ Caches twitch game id to game name lookups, so each unknown game is
+    only looked up once per ttl no matter how many streamers are playing it.
+
+    === Public Attributes ===
+    db: optional StreamerDatabase game names are persisted to, so they
+        survive restarts. None if names are only kept in memory.
+
+    === Private Attributes ===
+    _names: LRU cache of game id to game name
+
+    """
+
+    def __init__(self, maxsize=2048, ttl=86400, db=None):
+        self.db = db
+        self._names = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    async def resolve(self, game_ids: List[str], fetch) -> Dict[str, str]:
+        """ return a dict mapping every id in :game_ids: to its game name.
+        ids not cached are looked up in the database, then all remaining ones
+        are passed to the coroutine function :fetch: at once, which must
+        return a dict of id to name for the ids it was given.
+        """
+        names = {}
+        missing = []
+        for game_id in set(game_ids):
+            if not game_id:
+                continue
+            name = self._names.get(game_id)
+            if name is None:
+                missing.append(game_id)
+            else:
+                names[game_id] = name
+
+        if missing and self.db is not None:
+            stored = await self.db.get_game_names(missing)
+            self._add(names, stored)
+            missing = [game_id for game_id in missing if game_id not in stored]
+
+        if missing:
+            fetched = await fetch(missing)
+            self._add(names, fetched)
+            if fetched and self.db is not None:
+                await self.db.save_game_names(fetched)
+
+        return names
+
+    def stats(self) -> dict:
+        return self._names.stats()
+
+    def _add(self, names: dict, found: dict) -> None:
+        for game_id, name in found.items():
+            self._names.set(game_id, name)
+            names[game_id] = name
@@ -0,0 +1,19 @@
+class GuildSettings:
+    """ Snapshot of the settings of one guild, kept in memory by
+    ServerManageDatabase and written through to the database whenever a
+    setting changes. New per guild settings belong here.
+
+    === Public Attributes ===
+    guild_id: id of the guild these settings belong to
+    announcement_chnl: id of the channel go live messages are sent to, None
+                       if the guild hasn't got one
+
+    """
+
+    def __init__(self, guild_id: str, announcement_chnl=None):
+        self.guild_id = guild_id
+        self.announcement_chnl = announcement_chnl
+
+    def __repr__(self) -> str:
+        return 'GuildSettings(' + self.guild_id + ', announcement_chnl=' + \
+               str(self.announcement_chnl) + ')'
@@ -0,0 +1,84 @@
+import asyncio
+import re
+
+
+class GuildTableMigration:
+    """ Moves the rows of the old per guild g<id>_streamers and
+    g<id>_bannedusers tables into the shared guild_streamers and guild_bans
+    tables, then drops the old tables.
+
+    Runs while the bot is online: the bot only uses the shared tables, rows
+    are copied with INSERT IGNORE so a copy interrupted part way can simply
+    be run again, and tables are moved a batch at a time with a pause in
+    between so the migration never hogs the database.
+
+    === Public Attributes ===
+    db: ServerManageDatabase, used to run the migration's statements and
+        drop cached bans of guilds whose bans were moved
+    batch_size: number of old tables moved before pausing
+    pause: seconds paused between batches
+
+    """
+    _legacy_table = re.compile(r'g(\d+)_(streamers|bannedusers)')
+    # maps the suffix of an old table to its new table and value column
+    _targets = {'streamers': ('guild_streamers', 'Streamer_login'),
+                'bannedusers': ('guild_bans', 'User_ID')}
+
+    def __init__(self, db, batch_size=50, pause=0.5):
+        self.db = db
+        self.batch_size = batch_size
+        self.pause = pause
+
+    async def run(self, suffix=None) -> int:
+        """ moves every old table over, or only the old tables ending in
+        :suffix: if given, return the number of tables moved.
+        """
+        tables = await self.legacy_tables(suffix)
+        for i in range(0, len(tables), self.batch_size):
+            for table in tables[i:i + self.batch_size]:
+                await self.migrate_table(table)
+            await asyncio.sleep(self.pause)
+        if tables:
+            print('Moved ' + str(len(tables)) + ' per guild tables')
+        return len(tables)
+
+    async def legacy_tables(self, suffix=None) -> list:
+        """ return the names of all old per guild tables still left, only
+        those ending in :suffix: if given.
+        """
+        tables = []
+        async for table in self.db.stream('SHOW TABLES;'):
+            match = self._legacy_table.fullmatch(table[0])
+            if match and suffix in (None, match.group(2)):
+                tables.append(table[0])
+        return tables
+
+    async def migrate_table(self, table: str) -> None:
+        """ copies the rows of old table :table: into its shared table and
+        drops it.
+        """
+        guild_id, suffix = self._legacy_table.fullmatch(table).groups()
+        target, column = self._targets[suffix]
+        # the name was matched against _legacy_table, so it is safe to use
+        await self.db.execute('INSERT IGNORE INTO ' + target +
+                              ' (Guild_ID, ' + column + ') SELECT %s, ' +
+                              column + ' FROM ' + table + ';', (guild_id,))
+        if target == 'guild_bans':
+            # a ban check may have cached the guild before its bans arrived
+            self.db.forget_bans(guild_id)
+        await self.db.execute('DROP TABLE ' + table + ';')
+
+
+if __name__ == '__main__':
+    # run the migration by itself, without starting the bot
+    from Classes.database import ServerManageDatabase, StreamerDatabase
+    from Classes.db_pool import connection_pool
+
+    async def main():
+        await StreamerDatabase().initialize()  # creates the shared tables
+        db = ServerManageDatabase()
+        await db.initialize()
+        await GuildTableMigration(db).run()
+        await connection_pool.close()
+
+    asyncio.get_event_loop().run_until_complete(main())
@@ -0,0 +1,87 @@
+import aiohttp
+import config
+from typing import Mapping, NamedTuple, Optional
+
+
+class HttpResponse(NamedTuple):
+    status: int
+    headers: Mapping[str, str]
+    json: Optional[dict]
+
+
+class HttpClient:
+    """ One long lived aiohttp session shared by everything that talks to a web
+    api, so connections, TLS sessions and dns lookups are reused between
+    requests instead of being set up for every call.
+
+    === Public Attributes ===
+    limit: max number of open connections in total
+    limit_per_host: max number of open connections to a single host
+    dns_ttl: seconds a resolved host name is cached for
+    keepalive_timeout: seconds an idle connection is kept open for reuse
+    timeout: total seconds a request may take before it is abandoned
+
+    === Private Attributes ===
+    _session: the shared session, created on first use
+
+    """
+
+    def __init__(self, limit=100, limit_per_host=20, dns_ttl=300,
+                 keepalive_timeout=30, timeout=10):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        self._session = None
+
+    async def get(self, url: str, headers=None) -> HttpResponse:
+        return await self.request('GET', url, headers=headers)
+
+    async def post(self, url: str, data=None, headers=None,
+                   json=None) -> HttpResponse:
+        return await self.request('POST', url, headers=headers, data=data,
+                                  json=json)
+
+    async def request(self, method: str, url: str, **kwargs) -> HttpResponse:
+        """ sends a :method: request to :url:, passing :kwargs: on to
+        aiohttp. the json body is None if the response didn't have one.
+        """
+        session = self._get_session()
+        async with session.request(method, url, **kwargs) as resp:
+            try:
+                json = await resp.json(content_type=None)
+            except ValueError:  # body was empty or not json
+                json = None
+            return HttpResponse(resp.status, resp.headers, json)
+
+    async def close(self) -> None:
+        """ closes the shared session and all of its connections.
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # created lazily so the session binds to the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+
+http_client = HttpClient(
+    limit=getattr(config, 'http_connection_limit', 100),
+    limit_per_host=getattr(config, 'http_connection_limit_per_host', 20),
+    dns_ttl=getattr(config, 'http_dns_cache_ttl', 300),
+    keepalive_timeout=getattr(config, 'http_keepalive_timeout', 30),
+    timeout=getattr(config, 'http_timeout', 10)
+)
@@ -0,0 +1,69 @@
+from collections import OrderedDict
+from time import time
+
+
+class LRUCache:
+    """ Dict like cache holding at most maxsize items, evicting the least
+    recently used item once full. Items can optionally expire ttl seconds
+    after they were set.
+
+    === Public Attributes ===
+    maxsize: max number of items held
+    ttl: seconds an item stays valid for, None if items never expire
+    hits: number of lookups that found a valid item
+    misses: number of lookups that didn't
+
+    === Private Attributes ===
+    _items: maps a key to a tuple of (value, unix time it expires), ordered
+            from least to most recently used
+
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    def __contains__(self, key) -> bool:
+        return self._valid_item(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key, default=None):
+        """ return the value cached for :key:, or :default: if there is none.
+        """
+        item = self._valid_item(key)
+        if item is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._items.move_to_end(key)
+        return item[0]
+
+    def set(self, key, value) -> None:
+        expires = time() + self.ttl if self.ttl is not None else None
+        self._items[key] = (value, expires)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def pop(self, key, default=None):
+        item = self._items.pop(key, None)
+        return item[0] if item is not None else default
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def stats(self) -> dict:
+        return {'size': len(self._items), 'maxsize': self.maxsize,
+                'hits': self.hits, 'misses': self.misses}
+
+    def _valid_item(self, key):
+        item = self._items.get(key)
+        if item is not None and item[1] is not None and item[1] <= time():
+            del self._items[key]
+            item = None
+        return item
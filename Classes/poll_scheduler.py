@@ -0,0 +1,119 @@
+import heapq
+from collections import deque
+from time import time
+
+
+class PollScheduler:
+    """ Decides which streamers are polled each live check tick. Streamers
+    that are live, or usually go live around this time of the week, are
+    polled every tick while streamers that stay offline are polled less and
+    less often, without ever polling more than budget streamers a tick.
+
+    === Public Attributes ===
+    tick_interval: seconds between live check ticks
+    budget: max number of streamers polled in one tick
+    max_interval: max seconds between polls of a streamer
+    window: seconds either side of a past go live time of the week that
+            counts as a streamer usually being live
+    history: maps a streamer login to the unix times they recently went live
+
+    === Private Attributes ===
+    _next_check: maps a streamer login to the unix time they are due
+    _heap: (unix time due, login) of every scheduled poll, may hold stale
+           entries for logins rescheduled or removed since
+    _misses: maps a streamer login to how many polls in a row found them
+             offline
+
+    """
+    _week = 7 * 24 * 60 * 60
+
+    def __init__(self, tick_interval=90, budget=1000, max_interval=3600,
+                 window=3600, history_size=50):
+        self.tick_interval = tick_interval
+        self.budget = budget
+        self.max_interval = max_interval
+        self.window = window
+        self._history_size = history_size
+        self.history = {}
+        self._next_check = {}
+        self._heap = []
+        self._misses = {}
+
+    def sync(self, logins) -> None:
+        """ schedules every login in :logins: not yet scheduled to be polled
+        straight away, and stops polling scheduled logins not in :logins:.
+        """
+        logins = set(logins)
+        for login in logins:
+            if login not in self._next_check:
+                self._schedule(login, time())
+        for login in [l for l in self._next_check if l not in logins]:
+            del self._next_check[login]
+            self._misses.pop(login, None)
+
+    def due(self, now=None) -> list:
+        """ return up to budget logins due to be polled, the most overdue
+        first. they are scheduled again once their poll is recorded.
+        """
+        now = time() if now is None else now
+        to_poll = []
+        while self._heap and len(to_poll) < self.budget:
+            when, login = self._heap[0]
+            if when > now + self.tick_interval / 2:
+                break  # ticks drift, so poll anything closer to this tick than the next
+            heapq.heappop(self._heap)
+            if self._next_check.get(login) != when:
+                continue  # rescheduled or removed since this entry was made
+            to_poll.append(login)
+            del self._next_check[login]
+        return to_poll
+
+    def load_history(self, history: dict, live=()) -> None:
+        """ remembers the go live times of :history:, a dict mapping a login
+        to the unix times they went live oldest first. logins in :live: were
+        already live and recorded before, so finding them live isn't counted
+        as going live again.
+        """
+        for login, times in history.items():
+            self.history[login] = deque(times, maxlen=self._history_size)
+        for login in live:
+            self._misses.setdefault(login, 0)
+
+    def record(self, login: str, is_live: bool, now=None) -> bool:
+        """ reschedules :login: after a poll or event found them :is_live:,
+        remembering when they go live. return True if they just went live.
+        """
+        now = time() if now is None else now
+        went_live = False
+        if is_live:
+            if self._misses.get(login, 1) > 0:  # just went live
+                history = self.history.setdefault(
+                    login, deque(maxlen=self._history_size))
+                history.append(now)
+                went_live = True
+            self._misses[login] = 0
+            interval = self.tick_interval
+        elif self.usually_live(login, now):
+            self._misses[login] = self._misses.get(login, 0) + 1
+            interval = self.tick_interval
+        else:
+            misses = self._misses.get(login, 0) + 1
+            self._misses[login] = misses
+            interval = min(self.max_interval,
+                           self.tick_interval * 2 ** (misses - 1))
+        self._schedule(login, now + interval)
+        return went_live
+
+    def usually_live(self, login: str, now: float) -> bool:
+        """ return whether :login: has gone live within window of this time of
+        the week before.
+        """
+        for went_live in self.history.get(login, ()):
+            diff = (now - went_live) % self._week
+            if min(diff, self._week - diff) <= self.window:
+                return True
+        return False
+
+    def _schedule(self, login: str, when: float) -> None:
+        self._next_check[login] = when
+        heapq.heappush(self._heap, (when, login))
@@ -0,0 +1,102 @@
+import asyncio
+import aiohttp
+from random import uniform
+from time import time
+from Classes.exceptions import TwitchRequestError
+from Classes.http_client import HttpResponse
+
+
+class TwitchRequestScheduler:
+    """ Paces requests to the twitch api with a token bucket that follows the
+    Ratelimit-Remaining and Ratelimit-Reset headers helix sends back, and
+    retries failed requests a bounded number of times with jittered
+    exponential backoff.
+
+    === Public Attributes ===
+    capacity: max number of requests that can be sent in a burst
+    refill_rate: number of requests per second the bucket refills by
+    max_retries: max number of times a failing request is sent again
+    base_delay: seconds waited before the first retry, doubling every retry
+    max_delay: max seconds waited before a retry
+
+    === Private Attributes ===
+    _tokens: number of requests that can be sent right now
+    _last_refill: unix time the bucket was last refilled
+    _reset_at: unix time twitch said our rate limit resets, once it reported
+               none remaining
+
+    """
+    _retry_statuses = (429, 500, 502, 503, 504)
+
+    def __init__(self, capacity=800, refill_rate=800 / 60, max_retries=5,
+                 base_delay=1, max_delay=30):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._tokens = capacity
+        self._last_refill = time()
+        self._reset_at = 0
+
+    async def request(self, url: str, send) -> HttpResponse:
+        """ return the response of calling the coroutine function :send:,
+        waiting for the rate limit first. rate limited, server error,
+        unreadable and connection failures are retried up to max_retries
+        times, anything else is returned to the caller as is.
+        """
+        status = 0
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff(attempt))
+            await self.acquire()
+            try:
+                resp = await send()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                continue
+
+            status = resp.status
+            self.update(resp.headers)
+            if status not in self._retry_statuses and \
+                    not (status == 200 and resp.json is None):
+                return resp
+        raise TwitchRequestError(url, status)
+
+    async def acquire(self) -> None:
+        """ waits until a request may be sent, and takes a token for it.
+        """
+        while True:
+            now = time()
+            if self._reset_at > now:
+                await asyncio.sleep(self._reset_at - now)
+                continue
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.refill_rate)
+
+    def update(self, headers) -> None:
+        """ syncs the bucket with the rate limit headers of a helix response.
+        responses without them, like the oauth endpoint, change nothing.
+        """
+        try:
+            remaining = int(headers['Ratelimit-Remaining'])
+            reset = int(headers['Ratelimit-Reset'])
+        except (KeyError, ValueError):
+            return
+        self._tokens = min(self._tokens, remaining)
+        if remaining == 0:
+            self._reset_at = reset
+
+    def backoff(self, attempt: int) -> float:
+        """ return seconds to wait before retry number :attempt:, randomized
+        so many failing requests don't all retry at the same moment.
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return uniform(delay / 2, delay)
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens +
+                           (now - self._last_refill) * self.refill_rate)
+        self._last_refill = now
@@ -0,0 +1,96 @@
+import asyncio
+from time import time
+
+
+class SchemaMigrations:
+    """ Brings the database schema up to date by running every migration
+    newer than the version recorded in the schema_version table, in order.
+    Each migration is recorded as soon as it finishes, so an interrupted run
+    picks up where it stopped.
+
+    === Public Attributes ===
+    db: any database class, used to run the migrations' statements
+
+    === Private Attributes ===
+    _lock: CLASS ATTRIBUTE, stops two runs in this process overlapping
+
+    """
+    _table_name = 'schema_version'
+    _lock = None
+
+    def __init__(self, db):
+        self.db = db
+
+    @staticmethod
+    def migrations() -> list:
+        """ return every migration as a (version, description, statements)
+        tuple, in the order they are run. never change a released migration,
+        add a new one instead.
+        """
+        return [
+            (1, 'dedupe players and key them by Player_ID',
+             SchemaMigrations._rebuild(
+                 'players',
+                 ['Player_ID BIGINT NOT NULL PRIMARY KEY',
+                  'Credits INT NOT NULL DEFAULT 0',
+                  'Daily_Reset BIGINT NOT NULL DEFAULT 0'],
+                 # keep the best of any duplicate rows
+                 'SELECT Player_ID, MAX(Credits), MAX(Daily_Reset) '
+                 'FROM players WHERE Player_ID IS NOT NULL '
+                 'GROUP BY Player_ID')),
+            (2, 'dedupe announce_chnl and key it by Guild_ID',
+             SchemaMigrations._rebuild(
+                 'announce_chnl',
+                 ['Guild_ID BIGINT NOT NULL PRIMARY KEY',
+                  'Announcement_ID BIGINT'],
+                 'SELECT Guild_ID, MAX(Announcement_ID) FROM announce_chnl '
+                 'WHERE Guild_ID IS NOT NULL GROUP BY Guild_ID')),
+        ]
+
+    async def run(self) -> None:
+        """ runs every migration not yet applied.
+        """
+        if SchemaMigrations._lock is None:
+            SchemaMigrations._lock = asyncio.Lock()
+        async with SchemaMigrations._lock:
+            await self.db.create_table(self._table_name,
+                                       ['Version INT PRIMARY KEY',
+                                        'Description VARCHAR(255)',
+                                        'Applied_At BIGINT'])
+            current = await self.version()
+            for version, description, statements in self.migrations():
+                if version <= current:
+                    continue
+                print('Migrating schema to version ' + str(version) + ': ' +
+                      description)
+                for statement in statements:
+                    await self.db.execute(statement)
+                await self.db.insert(self._table_name,
+                                     ['Version', 'Description', 'Applied_At'],
+                                     [version, description, int(time())])
+
+    async def version(self) -> int:
+        """ return the version of the last migration applied, 0 if none.
+        """
+        rows = await self.db.execute('SELECT MAX(Version) FROM ' +
+                                     self._table_name + ';',
+                                     return_results=True)
+        return rows[0][0] or 0
+
+    @staticmethod
+    def _rebuild(table: str, columns: list, select: str) -> list:
+        """ return statements that rebuild :table: with :columns:, filled from
+        the old table by :select:, swapping the two atomically.
+        """
+        new = table + '_new'
+        old = table + '_old'
+        # an interrupted run may have left either copy behind
+        return [
+            'DROP TABLE IF EXISTS ' + old + ';',
+            'DROP TABLE IF EXISTS ' + new + ';',
+            'CREATE TABLE ' + new + ' (' + ', '.join(columns) + ');',
+            'INSERT INTO ' + new + ' ' + select + ';',
+            'RENAME TABLE ' + table + ' TO ' + old + ', ' + new + ' TO ' +
+            table + ';',
+            'DROP TABLE ' + old + ';'
+        ]
@@ -0,0 +1,81 @@
+import asyncio
+from Classes.exceptions import TwitchAuthorizationError
+from Classes.http_client import http_client
+from Classes.rate_limiter import TwitchRequestScheduler
+from time import time
+
+
+class TwitchTokenManager:
+    """ Hands out twitch app access tokens, caching one client credentials
+    token per scope until shortly before it expires.
+
+    === Public Attributes ===
+    refresh_margin: seconds before a token expires that it is refreshed
+
+    === Private Attributes ===
+    _client_id: credential to use twitch api
+    _client_secret: credential to create oauth token
+    _scheduler: paces and retries requests to the token endpoint
+    _tokens: maps a scope to a tuple of (token, unix time it expires)
+    _locks: maps a scope to the lock held while refreshing its token, so
+            concurrent callers wait for one refresh instead of each making one
+
+    """
+    _token_url = 'https://id.twitch.tv/oauth2/token'
+
+    def __init__(self, client_id: str, client_secret: str,
+                 scheduler: TwitchRequestScheduler, refresh_margin=300):
+        self.refresh_margin = refresh_margin
+        self._client_id = client_id
+        self._client_secret = client_secret
+        self._scheduler = scheduler
+        self._tokens = {}
+        self._locks = {}
+
+    async def get_token(self, scope='') -> str:
+        """ return a valid token for :scope:, only requesting a new one from
+        twitch when there is no cached token or it is about to expire.
+        """
+        token = self._cached_token(scope)
+        if token is not None:
+            return token
+
+        lock = self._locks.setdefault(scope, asyncio.Lock())
+        async with lock:
+            token = self._cached_token(scope)  # refreshed while we waited
+            if token is None:
+                json = await self._request_token(scope)
+                token = json['access_token']
+                expires = time() + json.get('expires_in', 0)
+                self._tokens[scope] = (token, expires)
+        return token
+
+    def invalidate(self, scope: str, token: str) -> None:
+        """ drop :token: for :scope: so the next get_token refreshes it.
+        does nothing if the cached token was already replaced.
+        """
+        cached = self._tokens.get(scope)
+        if cached is not None and cached[0] == token:
+            del self._tokens[scope]
+
+    def _cached_token(self, scope: str):
+        cached = self._tokens.get(scope)
+        if cached is not None and cached[1] - self.refresh_margin > time():
+            return cached[0]
+        return None
+
+    async def _request_token(self, scope: str) -> dict:
+        params = {
+            'client_id': self._client_id,
+            'client_secret': self._client_secret,
+            'grant_type': 'client_credentials'
+        }
+        if scope != '':
+            params['scope'] = scope
+        resp = await self._scheduler.request(
+            self._token_url,
+            lambda: http_client.post(self._token_url, data=params)
+        )
+        if resp.json is None or 'access_token' not in resp.json:
+            raise TwitchAuthorizationError
+        return resp.json
@@ -1,8 +1,14 @@
 import asyncio
-import aiohttp
 import config
 import time
-from Classes.exceptions import Error401Exception, TwitchAuthorizationError
+from urllib.parse import urlencode
+from Classes.concurrency import gather_bounded
+from Classes.exceptions import Error401Exception, TwitchAuthorizationError, \
+    TwitchRequestError
+from Classes.game_name_cache import GameNameCache
+from Classes.http_client import HttpResponse, http_client
+from Classes.rate_limiter import TwitchRequestScheduler
+from Classes.twitch_auth import TwitchTokenManager
 
 
 class TwitchStreamer:
@@ -10,106 +16,192 @@ class TwitchStreamer:
 
     === Public Attributes ===
     streamer_name: name of the streamer represented by this object
+    user_id: twitch user id of the streamer, None until they are validated
+    display_name: name of the streamer as it is shown on twitch
     valid: whether the streamer represented is a valid twitch user
     is_live: whether the streamer represented is currently streaming
     stream_title: if the streamer is live, this will be the title the are live under
     stream_game: if the streamer is live, this will be the game the are streaming
     viewers: if the streamer is live, this will be the number of viewers they have
+    game_names: CLASS ATTRIBUTE, process wide cache of game id to game name
+    workers: CLASS ATTRIBUTE, max number of batched requests sent at once
 
     === Private Attributes ===
     _client_id: CLASS ATTRIBUTE, credential to use twitch api
     _client_secret: CLASS ATTRIBUTE, credential to create oauth token
+    _scheduler: CLASS ATTRIBUTE, paces and retries every request to twitch
+    _tokens: CLASS ATTRIBUTE, process wide cache of oauth tokens
+    _batch_size: CLASS ATTRIBUTE, max number of logins or ids helix accepts in
+                 one streams/users/games request
 
     """
     _client_id = config.twitch_client_id
     _client_secret = config.twitch_client_secret
-
-    def __init__(self, user: str):
+    _scheduler = TwitchRequestScheduler(
+        capacity=getattr(config, 'twitch_rate_limit', 800),
+        refill_rate=getattr(config, 'twitch_rate_limit', 800) / 60,
+        max_retries=getattr(config, 'twitch_max_retries', 5)
+    )
+    _tokens = TwitchTokenManager(_client_id, _client_secret, _scheduler)
+    _batch_size = 100
+    workers = getattr(config, 'twitch_workers', 4)
+    game_names = GameNameCache(
+        maxsize=getattr(config, 'twitch_game_cache_size', 2048),
+        ttl=getattr(config, 'twitch_game_cache_ttl', 86400)
+    )
+
+    def __init__(self, user: str, user_id=None, display_name=None):
         self.streamer_name = user
-        self.valid = False
+        self.user_id = user_id
+        self.display_name = display_name if display_name else user
+        self.valid = user_id is not None
         self.is_live = False
         self.stream_title = ''
         self.stream_game = ''
         self.viewers = 0
 
     async def update_streamer_info(self):
-        if not self.valid:
-            await self.validate_user()
-
-        if self.valid:
-            url = 'https://api.twitch.tv/helix/streams?user_login=' + \
-                  self.streamer_name
-            json = await TwitchStreamer._get_data(url)
-            data = json['data']
-            self.is_live = not (data == [])  # the value of 'data' for a non-live streamer is []
-
-            if self.is_live:
-                data = data[0]
-                self.streamer_name = data['user_name']
-                self.stream_title = data['title']
-                self.stream_game = await TwitchStreamer.game_id_to_name(data['game_id'])
-                self.viewers = data['viewer_count']
-            else:
-                self.stream_title = ''
-                self.stream_game = ''
-                self.viewers = 0
+        await TwitchStreamer.update_streamers([self])
 
     async def validate_user(self) -> bool:
-        url = 'https://api.twitch.tv/helix/users?login=' + self.streamer_name
-        json = await TwitchStreamer._get_data(url, scope='user:read:email')
-        self.valid = (not json['data'] == [])
+        users = await TwitchStreamer.get_users([self.streamer_name])
+        user = users.get(self.streamer_name.lower())
+        if user is not None:
+            self.set_user(user)
         return self.valid
 
+    def set_user(self, user: dict) -> None:
+        """ marks this streamer as valid, using the helix :user: object for
+        their id and display name.
+        """
+        self.user_id = user['id']
+        self.display_name = user['display_name']
+        self.valid = True
+
+    @staticmethod
+    async def update_streamers(streamers: list) -> None:
+        """ Updates the stream info of every TwitchStreamer in :streamers:,
+        packing up to _batch_size streamers into each helix users/streams
+        request instead of making requests per streamer. Streamers that
+        already know their user id are not validated again.
+        """
+        to_validate = [s.streamer_name for s in streamers if not s.valid]
+        users = await TwitchStreamer.get_users(to_validate)
+        for s in streamers:
+            user = users.get(s.streamer_name.lower())
+            if user is not None:
+                s.set_user(user)
+
+        valid = [s for s in streamers if s.valid]
+        streams = {}
+        for data in await TwitchStreamer._get_batched(
+                'https://api.twitch.tv/helix/streams', 'user_id',
+                [s.user_id for s in valid]):
+            streams[data['user_id']] = data
+
+        games = await TwitchStreamer.game_names.resolve(
+            [data['game_id'] for data in streams.values()],
+            TwitchStreamer._fetch_game_names
+        )
+
+        for s in valid:
+            data = streams.get(s.user_id)
+            s.is_live = data is not None
+
+            if s.is_live:
+                s.display_name = data['user_name']
+                s.stream_title = data['title']
+                s.stream_game = games.get(data['game_id'], '')
+                s.viewers = data['viewer_count']
+            else:
+                s.stream_title = ''
+                s.stream_game = ''
+                s.viewers = 0
+
+    @staticmethod
+    async def get_users(logins: list) -> dict:
+        """ return a dict mapping the lowercase login of every valid twitch
+        user in :logins: to their helix user object. Looks up to _batch_size
+        logins per request.
+        """
+        users = await TwitchStreamer._get_users('login', logins)
+        return {user['login'].lower(): user for user in users}
+
+    @staticmethod
+    async def get_users_by_id(user_ids: list) -> dict:
+        """ return a dict mapping every id in :user_ids: that still belongs to
+        a twitch user to their helix user object.
+        """
+        users = await TwitchStreamer._get_users('id', user_ids)
+        return {user['id']: user for user in users}
+
+    @staticmethod
+    async def _get_users(param: str, values: list) -> list:
+        return await TwitchStreamer._get_batched(
+            'https://api.twitch.tv/helix/users', param, values,
+            scope='user:read:email')
+
+    @staticmethod
+    async def _get_batched(url: str, param: str, values: list,
+                           scope='') -> list:
+        """ return the combined data of GET requests to :url: for every value
+        in :values:. up to _batch_size values are sent as :param: in each
+        request, and up to workers requests are sent at the same time.
+        """
+        size = TwitchStreamer._batch_size
+        urls = [url + '?' + urlencode([(param, value)
+                                       for value in values[i:i + size]])
+                for i in range(0, len(values), size)]
+        results = await gather_bounded(
+            [TwitchStreamer._get_data(u, scope=scope) for u in urls],
+            TwitchStreamer.workers)
+        return [data for json in results for data in json['data']]
+
     @staticmethod
     async def game_id_to_name(game_id: str) -> str:
-        url = 'https://api.twitch.tv/helix/games?id=' + game_id
-        json = await TwitchStreamer._get_data(url)
+        games = await TwitchStreamer.game_names.resolve(
+            [game_id], TwitchStreamer._fetch_game_names)
+        return games.get(game_id, '')
 
-        return json['data'][0]['name']
+    @staticmethod
+    async def _fetch_game_names(game_ids: list) -> dict:
+        """ return a dict of game id to game name for :game_ids:.
+        """
+        games = await TwitchStreamer._get_batched(
+            'https://api.twitch.tv/helix/games', 'id', game_ids)
+        return {game['id']: game['name'] for game in games}
 
     @staticmethod
-    async def _get_data(url, scope='') -> dict:
-        json = {}
-        while 'data' not in json:  # sometimes we get an unauthorized response, this tries again if that happens
-            token = await TwitchStreamer._get_token(scope=scope)
+    async def helix_request(method: str, url: str, scope='',
+                            json=None) -> HttpResponse:
+        """ return the response of an authorized :method: request to the
+        twitch api at :url:, with :json: as the body if given.
+        """
+        refreshed = False
+        while True:
+            token = await TwitchStreamer._tokens.get_token(scope=scope)
             headers = {
                 'Authorization': 'Bearer ' + token,
                 'client-id': TwitchStreamer._client_id
             }
-            json = await TwitchStreamer._get_request(url, headers)
-        return json
+            resp = await TwitchStreamer._scheduler.request(
+                url, lambda: http_client.request(method, url, headers=headers,
+                                                 json=json))
+
+            if resp.status != 401:
+                return resp
+            # token was revoked or expired early, refresh it once
+            if refreshed:
+                raise TwitchAuthorizationError
+            TwitchStreamer._tokens.invalidate(scope, token)
+            refreshed = True
 
     @staticmethod
-    async def _get_token(scope=''):
-        url = 'https://id.twitch.tv/oauth2/token'
-        params = {
-            'client_id': TwitchStreamer._client_id,
-            'client_secret': TwitchStreamer._client_secret,
-            'grant_type': 'client_credentials'
-        }
-        if scope != '':
-            params['scope'] = scope
-        json = {}
-        while json is None or 'access_token' not in json:
-            json = await TwitchStreamer._post_request(url, params)
-        return json['access_token']
-
-    @staticmethod
-    async def _get_request(url, headers) -> dict:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url=url, headers=headers) as resp:
-                json = await resp.json()
-                print(json)
-        return json
-
-    @staticmethod
-    async def _post_request(url, params) -> dict:
-        json = None  # sometimes we get None as response, while loop tries again  till its a non None response
-        while json is None:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url=url, data=params) as resp:
-                    json = await resp.json()
-        return json
+    async def _get_data(url, scope='') -> dict:
+        resp = await TwitchStreamer.helix_request('GET', url, scope=scope)
+        if resp.json is None or 'data' not in resp.json:
+            raise TwitchRequestError(url, resp.status)
+        return resp.json
 
 
 if __name__ == '__main__':
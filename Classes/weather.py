@@ -1,5 +1,6 @@
-import aiohttp
 from datetime import datetime
+from typing import Optional
+from Classes.http_client import http_client
 
 
 class Weather:
@@ -19,42 +20,37 @@ class Weather:
         self._query_url = 'http://api.openweathermap.org/data/2.5/' \
                           'forecast?id=524901&APPID=' + api_key
 
-    async def get_report(self, location: str) -> str:
+    async def get_report(self, location: str) -> Optional[str]:
+        """ return a weather report for :location:, or None if it isn't a
+        location the api knows.
+        """
         url = self._query_url + '&q=' + location
+        resp = await http_client.get(url)
+        if resp.status != 200:
+            return None
+
+        weather_info = resp.json
+        current_weather = weather_info['list'][00]
+        report = 'Report Generated for: '
+
+        timestamp = current_weather['dt'] + weather_info['city']['timezone']
+        actual_tmp = self._k_to_celsius(current_weather['main']['temp'])
+        felt_tmp = self._k_to_celsius(current_weather['main']['feels_like'])
+        condition = current_weather['weather'][0]['main'] + ', ' + \
+                    current_weather['weather'][0]['description']
 
-        if await self.is_valid_location(location):
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url=url) as resp:
-                    weather_info = await resp.json()
-                    current_weather = weather_info['list'][00]
-                    report = 'Report Generated for: '
-
-                    timestamp = current_weather['dt'] + weather_info['city'][
-                        'timezone']
-                    actual_tmp = self._k_to_celsius(
-                        current_weather['main']['temp'])
-                    felt_tmp = self._k_to_celsius(
-                        current_weather['main']['feels_like'])
-                    condition = current_weather['weather'][0]['main'] + ', ' + \
-                                current_weather['weather'][0]['description']
-
-                    report += str(datetime.utcfromtimestamp(timestamp)) + \
-                              ' Local time.\n'
-                    report += 'Weather: ' + condition + '\n'
-                    report += 'Actual Temperature: ' + str(
-                        actual_tmp) + '°C\n' + \
-                              'Feels Like: ' + str(felt_tmp) + '°C'
-
-                    return report
+        report += str(datetime.utcfromtimestamp(timestamp)) + ' Local time.\n'
+        report += 'Weather: ' + condition + '\n'
+        report += 'Actual Temperature: ' + str(actual_tmp) + '°C\n' + \
+                  'Feels Like: ' + str(felt_tmp) + '°C'
+
+        return report
 
     async def is_valid_location(self, location: str) -> bool:
         """return if api query returned valid response
         """
         url = self._query_url + '&q=' + location
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url=url) as resp:
-                return resp.status == 200
+        return (await http_client.get(url)).status == 200
 
     def _k_to_celsius(self, kelvin: float) -> float:
         """ converts kelvin temps to celsius, rounds to 1 decimal.
@@ -1,3 +1,4 @@
+import asyncio
 import discord
 import config
 import Classes.database as database
@@ -7,17 +8,74 @@ from cogs import twitch, announce, manage_users, games
 from Classes.weather import Weather
 from Classes.exceptions import BlockedCommandError
 from Classes.check_live import CheckLive
+from Classes.db_pool import connection_pool
+from Classes.eventsub import EventSubManager, EventSubReceiver
+from Classes.guild_table_migration import GuildTableMigration
+from Classes.poll_scheduler import PollScheduler
+from Classes.schema_migrations import SchemaMigrations
+from Classes.http_client import http_client
+from Classes.twitch_streamer import TwitchStreamer
 from random import randint
+from time import monotonic
 
-bot = commands.Bot(command_prefix=';',
-                   case_insensitive=True,
-                   help_command=None
-                   )
-management_db = database.ServerManageDatabase()
+process_start = monotonic()
+
+
+class Bot(commands.Bot):
+    started = False  # on_ready fires again on reconnects, only start once
+
+    async def start(self, *args, **kwargs):
+        # the schema is migrated before connecting, so no command can write
+        # to a table while it is being rebuilt
+        await prepare_database()
+        await super().start(*args, **kwargs)
+
+    async def close(self):
+        await super().close()
+        if eventsub_receiver is not None:
+            await eventsub_receiver.stop()
+        await games_db.close()
+        await http_client.close()
+        await connection_pool.close()
+
+
+bot = Bot(command_prefix=';',
+          case_insensitive=True,
+          help_command=None
+          )
+management_db = database.ServerManageDatabase(
+    ban_cache_size=getattr(config, 'ban_cache_guilds', 1000))
 streamer_db = database.StreamerDatabase()
-games_db = database.GamesDatabase()
+games_db = database.GamesDatabase(
+    ledger_path=getattr(config, 'credit_ledger_path', 'credit_ledger.log'),
+    flush_interval=getattr(config, 'credit_ledger_flush_interval', 1.0),
+    flush_size=getattr(config, 'credit_ledger_flush_size', 500),
+    player_cache_size=getattr(config, 'player_cache_size', 10000))
 w = Weather(config.open_weather_api_key)
-live_check = CheckLive(streamer_db, management_db)
+live_check = CheckLive(
+    streamer_db, management_db,
+    revalidate_after=getattr(config, 'twitch_revalidate_after', 86400),
+    scheduler=PollScheduler(
+        budget=getattr(config, 'twitch_poll_budget', 1000),
+        max_interval=getattr(config, 'twitch_poll_max_interval', 3600)
+    ),
+    workers=getattr(config, 'announce_workers', 8)
+)
+if getattr(config, 'twitch_persist_game_names', False):
+    TwitchStreamer.game_names.db = streamer_db
+
+eventsub_receiver = None
+eventsub_manager = None
+if getattr(config, 'twitch_eventsub_enabled', False):
+    eventsub_receiver = EventSubReceiver(
+        config.twitch_eventsub_secret,
+        {'stream.online': lambda event: live_check.stream_online(bot, event),
+         'stream.offline': live_check.stream_offline},
+        host=getattr(config, 'twitch_eventsub_host', '0.0.0.0'),
+        port=getattr(config, 'twitch_eventsub_port', 8080)
+    )
+    eventsub_manager = EventSubManager(config.twitch_eventsub_callback_url,
+                                       config.twitch_eventsub_secret)
 
 # ---Events---------------------------------------------------------------------
 
@@ -25,15 +83,60 @@ live_check = CheckLive(streamer_db, management_db)
 @bot.event
 async def on_ready():
     print("connected to discord")
-    await management_db.initialize()
-    await streamer_db.initialize()
-    await games_db.initialize()
-    await management_db.check_new_guilds(bot.guilds)
+    if bot.started:
+        return  # reconnected, everything is already set up
+    bot.started = True
+    try:
+        await start_up()
+    except BaseException:
+        bot.started = False  # let the next on_ready try again
+        raise
+
+
+async def prepare_database():
+    """ sets up the databases and brings their schema up to date, before the
+    bot connects to discord.
+    """
+    await timed('databases', asyncio.gather(management_db.initialize(),
+                                            streamer_db.initialize(),
+                                            games_db.initialize()))
+    await timed('migrations', SchemaMigrations(management_db).run())
+    # ban tables are small and is_banned only reads guild_bans, so they are
+    # moved before any command can be checked against them
+    await timed('ban tables',
+                GuildTableMigration(management_db).run('bannedusers'))
+
+
+async def start_up():
+    """ sets up everything needing a connection to discord and the background
+    tasks, recording how long each phase took in startup_timings.
+    """
+    startup_timings['connect'] = round(monotonic() - process_start, 3)
+    start = monotonic()
+    await asyncio.gather(
+        timed('ledger', games_db.start_ledger()),
+        timed('guilds', management_db.check_new_guilds(bot.guilds)),
+        timed('live state', live_check.load_state()))
+    # old per guild streamer tables are moved over in the background
+    migration = asyncio.ensure_future(
+        GuildTableMigration(management_db).run('streamers'))
+    migration.add_done_callback(log_task_failure)
 
     act = discord.Activity(name='twitch.tv/l337_WTD',
                            type=discord.ActivityType.watching)
     await bot.change_presence(activity=act)
-    await is_live.start()
+    if eventsub_receiver is not None:
+        await timed('eventsub', eventsub_receiver.start())
+        # polling is only a fallback for events EventSub missed
+        is_live.change_interval(
+            minutes=getattr(config, 'twitch_eventsub_poll_minutes', 15))
+    if not is_live.is_running():
+        is_live.start()
+    startup_timings['setup'] = round(monotonic() - start, 3)
+    # time to first command, from process start
+    startup_timings['total'] = round(monotonic() - process_start, 3)
+    started_up.set()
+    print('Startup timings (seconds):', startup_timings)
 
 
 @bot.event
@@ -45,6 +148,8 @@ async def on_guild_join(guild):
 async def on_message(message):
     if message.author.bot:
         return  # prevents other bots from using ours
+    # commands wait until the ledger and guild settings are set up
+    await started_up.wait()
 
     await bot.process_commands(message)
     # check if a command was invoked, after running this function's code
@@ -81,7 +186,7 @@ async def is_blocked(ctx) -> bool:
     verifies on every command.
     """
     if await management_db.is_banned(str(ctx.author.id), str(ctx.guild.id)):
-        raise BlockedCommandException
+        raise BlockedCommandError
     else:
         return True
 
@@ -154,8 +259,24 @@ async def bug(ctx, *, msg: str):
 
 @bot.command(name='weather')
 async def weather(ctx, *, location: str):
-    if await w.is_valid_location(location):
-        await ctx.send(await w.get_report(location))
+    report = await w.get_report(location)
+    if report is not None:
+        await ctx.send(report)
+
+
+@bot.command(name='stats')
+async def stats(ctx):
+    """ sends database pool and live check statistics, creator only.
+    """
+    if str(ctx.author.id) != config.discord_creator_id:
+        raise commands.CheckFailure
+    await ctx.send('```\nDatabase pool: ' + str(connection_pool.stats()) +
+                   '\nGuild settings: ' +
+                   str(management_db.guild_settings_stats()) +
+                   '\nBan cache: ' + str(management_db.ban_cache_stats()) +
+                   '\nPlayer cache: ' + str(games_db.player_cache_stats()) +
+                   '\nLive check: ' + str(live_check.stats) +
+                   '\nStartup: ' + str(startup_timings) + '\n```')
 
 
 @bot.command(name='code')
@@ -166,10 +287,39 @@ async def code(ctx):
 
 # ---METHODS--------------------------------------------------------------------
 
+startup_timings = {}  # seconds each startup phase took
+started_up = asyncio.Event()  # set once commands can be handled
+
+
+async def timed(phase: str, awaitable):
+    """ awaits :awaitable:, recording how long it took as :phase: in
+    startup_timings.
+    """
+    start = monotonic()
+    result = await awaitable
+    startup_timings[phase] = round(monotonic() - start, 3)
+    return result
+
+
+def log_task_failure(task: asyncio.Task) -> None:
+    """ done callback printing the error of a background :task: nothing
+    awaits.
+    """
+    if not task.cancelled() and task.exception() is not None:
+        print('Background task failed:', task.exception(),
+              type(task.exception()))
+
+
+async def sync_eventsub():
+    await eventsub_manager.sync(await live_check.subscribed_user_ids())
+
 # ---TASKS----------------------------------------------------------------------
 @tasks.loop(minutes=1.5)
 async def is_live():
-    await live_check.check_live(bot)
+    if eventsub_manager is not None:
+        live_check.start_tick(bot, after=sync_eventsub)
+    else:
+        live_check.start_tick(bot)
 
 # ---COGS-----------------------------------------------------------------------
 bot.add_cog(twitch.Twitch(streamer_db))
@@ -40,5 +40,9 @@ class Announce(commands.Cog):
     async def announce_view(self, ctx):
         await ctx.message.delete()
         a_chnl = await self.db.get_announcement_chnl(str(ctx.guild.id))
-        await ctx.send('The announcement channel is: ' +
-                       ctx.guild.get_channel(int(a_chnl)).mention)
+        chnl = ctx.guild.get_channel(int(a_chnl)) if a_chnl else None
+        if chnl is None:
+            await ctx.send('There is no announcement channel! Set one with '
+                           ';announce here')
+        else:
+            await ctx.send('The announcement channel is: ' + chnl.mention)
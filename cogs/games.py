@@ -16,8 +16,7 @@ class Games(commands.Cog):
         Games.db = db
 
     async def check_player_has_account(ctx) -> bool:
-        if not await Games.db.player_exists(str(ctx.author.id)):
-            await Games.db.create_player(str(ctx.author.id))
+        if await Games.db.ensure_player(str(ctx.author.id)):
             await ctx.author.send("An account has been created for you! You "
                                   "have 10 credits and your daily will reset "
                                   "in 24 hours. If you run out of credits you "
@@ -56,19 +55,16 @@ class Games(commands.Cog):
     @commands.check(check_player_has_account)
     async def daily(self, ctx):
         await ctx.message.delete()
-        last_daily = await Games.db.get_player_daily(str(ctx.author.id))
-        now = int(time())
-        time_dif = now - last_daily
         player = str(ctx.author.id)
 
-        if time_dif >= 86400:
-            await Games.db.update_player_daily(player)
+        if await Games.db.claim_player_daily(player):
             await self.gained_credits(ctx,
                                       player,
                                       randint(5, 25),
                                       Games.db
                                       )
         else:
+            time_dif = int(time()) - await Games.db.get_player_daily(player)
             hours = (86400 - time_dif) // 3600
             mins = ((86400 - time_dif) - (hours * 3600)) // 60
             await ctx.send(ctx.author.mention + ' you have ' +
@@ -100,17 +96,15 @@ class Games(commands.Cog):
     @commands.command(name='leaderboard')
     async def leaderboard(self, ctx):
         await ctx.message.delete()
-        users_in_guild = []
         msg = "The top players in this server are:\n"
-        for user in ctx.guild.members:
-            if await Games.db.player_exists(str(user.id)):
-                creds = await Games.db.get_player_credits(str(user.id))
+        top = await Games.db.get_top_players(
+            [str(user.id) for user in ctx.guild.members])
+        users_in_guild = []
+        for player_id, creds in top:
+            user = ctx.guild.get_member(int(player_id))
+            if user is not None:
                 users_in_guild.append((user.name, creds))
-
-        users_in_guild.sort(key=lambda x: x[1], reverse=True)
-        users = 10
-        if len(users_in_guild) < 10:
-            users = len(users_in_guild)
+        users = len(users_in_guild)
 
         for i in range(1, users + 1):
             user = users_in_guild[i - 1]
@@ -124,8 +118,11 @@ class Games(commands.Cog):
         await ctx.send(msg)
 
     @staticmethod
-    async def take_bet(player_id: str, bet: int, db: GamesDatabase):
-        await db.add_player_credits(player_id, -bet)
+    async def take_bet(player_id: str, bet: int, db: GamesDatabase) -> bool:
+        """ return whether the player had enough credits for :bet:, taking
+        it from them if they did.
+        """
+        return await db.take_player_credits(player_id, bet) is not None
 
     @staticmethod
     async def return_bet(player_id: str, bet: int, db: GamesDatabase):
@@ -140,10 +137,15 @@ class Games(commands.Cog):
         await db.add_player_credits(player_id, amount)
 
     @staticmethod
-    async def lost_credits(ctx, player_id: str, amount: int, db: GamesDatabase):
+    async def lost_credits(ctx, player_id: str, amount: int, db: GamesDatabase,
+                           bet_taken=False):
+        """ tells the player they lost :amount:, taking it from them unless
+        it was a bet already taken. never takes them below 0 credits.
+        """
         await ctx.send(ctx.author.mention + ' you have lost: ' +
                        str(amount) + ' Credits! Better luck next time!')
-        await db.add_player_credits(player_id, -1 * amount)
+        if not bet_taken:
+            await db.add_player_credits(player_id, -amount, floor=0)
 
 
 class SlotMachine(commands.Cog):
@@ -158,19 +160,16 @@ class SlotMachine(commands.Cog):
     async def slots(self, ctx, *, bet: Optional[int] = -1):
         if bet > 0:
             player = str(ctx.author.id)
-            if await Games.db.get_player_credits(player) < bet:
+            if not await Games.take_bet(player, bet, Games.db):
                 await ctx.send("Not enough credits to place bet!")
             else:
-                await Games.take_bet(player, bet, Games.db)
                 roll = SlotMachine._gen_roll()
                 result = SlotMachine._determine_win(roll)
                 await SlotMachine._send_roll(ctx, roll)
 
                 if result < 1:
-                    amount_lost = bet
-                    await Games.return_bet(player, int(amount_lost), Games.db)
-                    await Games.lost_credits(ctx, player,
-                                             int(amount_lost), Games.db)
+                    await Games.lost_credits(ctx, player, bet, Games.db,
+                                             bet_taken=True)
                 else:
                     amount_won = bet * result
                     await Games.gained_credits(ctx, player,
@@ -255,10 +254,9 @@ class Blackjack(commands.Cog):
             if player_id in Blackjack.games:
                 await ctx.send('Player is already in a game. '
                                'Finish the other game first!')
-            elif await Games.db.get_player_credits(player_id) < bet:
+            elif not await Games.take_bet(player_id, bet, Games.db):
                 await ctx.send('Not enough credits to place bet!')
             else:
-                await Games.take_bet(player_id, bet, Games.db)
                 msg = await ctx.send('Starting...')
                 chnl_id = ctx.channel.id
                 game = BlackjackGame(msg.id, chnl_id, ctx.author.mention, bet)
@@ -309,8 +307,8 @@ class Blackjack(commands.Cog):
                                                   'Your bet has been returned')
             await Games.return_bet(player_id, game.bet, Games.db)
         elif game_value < 0:
-            await Games.return_bet(player_id, game.bet, Games.db)
-            await Games.lost_credits(ctx, player_id, game.bet, Games.db)
+            await Games.lost_credits(ctx, player_id, game.bet, Games.db,
+                                     bet_taken=True)
         else:
             await Games.gained_credits(ctx, player_id, game.bet * 2, Games.db)
         # await discord_helpers.del_msgs_after([chnl.fetch_message(game.msg_id)])
@@ -12,26 +12,44 @@ class ManageUsers(commands.Cog):
     @commands.command(name='manageusers')
     @commands.has_permissions(administrator=True)
     async def manage_users(self, ctx):
-        await ctx.send('Use: \n;block <User> - Blocks <@User> from using '
-                       'commands \n;unblock <@User> - allows <User> to use '
-                       'commands again\n')
+        await ctx.send('Use: \n;block <User> ... - Blocks one or more <@User> '
+                       'from using commands \n;unblock <@User> - allows '
+                       '<User> to use commands again\n')
 
     @commands.command(name='block')
     @commands.has_permissions(administrator=True)
-    async def block(self, ctx, *, member: Optional[discord.Member] = None):
-        """ Admin only command. prevents :user: from accessing bot commands in
-        the guild the command is called in.
+    async def block(self, ctx, members: commands.Greedy[discord.Member], *,
+                    unresolved: str = ''):
+        """ Admin only command. prevents every member of :members: from
+        accessing bot commands in the guild the command is called in.
+        anything after the members that isn't one is listed as not found.
         """
-        if member:
+        if not members and unresolved:
+            # Greedy reads one word at a time, try the rest as one name
+            try:
+                members = [await commands.MemberConverter().convert(
+                    ctx, unresolved)]
+                unresolved = ''
+            except commands.BadArgument:
+                pass
+
+        if len(members) == 1:
+            member = members[0]
             if await self.db.block_user(str(member.id), str(ctx.guild.id)):
                 # user is not banned
                 await ctx.send('User ' + member.mention + ' was banned!')
             else:  # user already banned
                 await ctx.send('User ' + member.mention + ' already banned!')
-        else:
-            user_searched = ctx.message.content[7:]
+        elif members:
+            user_ids = list(dict.fromkeys(str(member.id) for member in members))
+            blocked = await self.db.block_users(user_ids, str(ctx.guild.id))
+            await ctx.send('Banned ' + str(blocked) + ' users! ' +
+                           str(len(user_ids) - blocked) +
+                           ' were already banned.')
+
+        if unresolved or not members:
             await ctx.send(
-                'Couldn\'t find user: ' + user_searched + '\n' +
+                'Couldn\'t find user: ' + unresolved + '\n' +
                 'Make sure you are using the correct '
                 'capitalization, or you can try mentioning them!'
                 )
@@ -1,7 +1,11 @@
 import discord_helpers as discord_helpers
+import re
 from discord.ext import commands
 from Classes.twitch_streamer import TwitchStreamer
 from Classes.database import StreamerDatabase
+from Classes.exceptions import TwitchAuthorizationError, TwitchRequestError
+
+_login = re.compile(r'[A-Za-z0-9_]{1,25}')
 
 
 class Twitch(commands.Cog):
@@ -16,22 +20,52 @@ class Twitch(commands.Cog):
                 ctx.message.content and 'view' not in ctx.message.content:
             await ctx.send(
                 'Use:\n'
-                ';twitch add <streamer name> - adds a streamer to'
-                ' get notifications for\n'
+                ';twitch add <streamer name> ... - adds one or more '
+                'streamers to get notifications for\n'
                 ';twitch remove <streamer name> - removes notifications for a '
                 'streamer\n'
                 ';twitch view - shows all streamers that '
                 'notifications are set for.')
 
     @twitch.command(name='add')
-    async def add_streamer(self, ctx, *, streamer_login: str):
-        stream = TwitchStreamer(streamer_login)
-        res = None
-        if await stream.validate_user():
-            await self.db.add_new_streamer(str(ctx.guild.id), streamer_login)
-            res = await ctx.send('Successfully added streamer!')
+    async def add_streamer(self, ctx, *streamer_logins: str):
+        """ adds every streamer of :streamer_logins: that is a twitch user,
+        validating them in batches.
+        """
+        if not streamer_logins:
+            raise commands.BadArgument
+        streamer_logins = list(dict.fromkeys(streamer_logins))  # drop repeats
+        # only ask twitch about names that could be logins at all
+        users = {}
+        possible = [login for login in streamer_logins
+                    if _login.fullmatch(login)]
+        try:
+            if possible:
+                users = await TwitchStreamer.get_users(possible)
+        except (TwitchRequestError, TwitchAuthorizationError) as e:
+            print(e)
+            res = await ctx.send('Couldn\'t reach twitch, try again later!')
+            await discord_helpers.del_msgs_after([ctx.message, res],
+                                                 delay_until_del=10)
+            return
+        found = [login for login in streamer_logins if login.lower() in users]
+        missing = [login for login in streamer_logins
+                   if login.lower() not in users]
+
+        if found:
+            await self.db.save_twitch_users(
+                [(login, users[login.lower()]['id'],
+                  users[login.lower()]['display_name']) for login in found])
+            await self.db.add_new_streamers(str(ctx.guild.id), found)
+        if not missing:
+            msg = 'Successfully added streamer!' if len(found) == 1 else \
+                  'Successfully added ' + str(len(found)) + ' streamers!'
+        elif not found and len(missing) == 1:
+            msg = 'Can\'t find streamer, check spelling!'
         else:
-            res = await ctx.send('Can\'t find streamer, check spelling!')
+            msg = 'Added ' + str(len(found)) + ' streamers! Can\'t find ' + \
+                  ', '.join(missing) + ', check spelling!'
+        res = await ctx.send(msg)
         await discord_helpers.del_msgs_after([ctx.message, res], delay_until_del=10)
 
     @twitch.command(name='remove')
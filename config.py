@@ -10,3 +10,36 @@ mysql_database_name = "NAME OF DATABASE TO USE HERE"
 twitch_client_id = "CLIENT ID HERE"
 twitch_client_secret = "CLIENT SECRET HERE"
 discord_creator_id = "ID HERE"
+
+# optional tuning, these defaults are used if left out
+http_connection_limit = 100
+http_connection_limit_per_host = 20
+http_dns_cache_ttl = 300  # seconds
+http_keepalive_timeout = 30  # seconds
+http_timeout = 10  # seconds
+twitch_game_cache_size = 2048
+twitch_game_cache_ttl = 86400  # seconds
+twitch_persist_game_names = False  # also keep game names in mysql
+twitch_revalidate_after = 86400  # seconds before a saved streamer is rechecked
+twitch_rate_limit = 800  # helix requests per minute
+twitch_max_retries = 5
+
+# push go live announcements with twitch EventSub instead of polling, needs
+# the bot to be reachable from the internet at twitch_eventsub_callback_url
+twitch_eventsub_enabled = False
+twitch_eventsub_callback_url = "https://YOUR DOMAIN HERE/eventsub"
+twitch_eventsub_secret = "RANDOM STRING 10-100 CHARACTERS LONG"
+twitch_eventsub_host = '0.0.0.0'
+twitch_eventsub_port = 8080  # the receiver always serves on path /eventsub
+twitch_eventsub_poll_minutes = 15  # how often polling catches missed events
+twitch_poll_budget = 1000  # max streamers polled per live check
+twitch_poll_max_interval = 3600  # seconds, longest wait between polls of a streamer
+twitch_workers = 4  # twitch requests sent at the same time during a live check
+announce_workers = 8  # go live messages sent at the same time
+mysql_pool_minsize = 1  # connections opened at startup
+mysql_pool_maxsize = 10  # keep below your MySQL max_connections
+ban_cache_guilds = 1000  # guilds whose ban lists are kept in memory
+credit_ledger_path = 'credit_ledger.log'  # unflushed credit changes, keep on a persistent disk
+credit_ledger_flush_interval = 1.0  # seconds between credit writes to mysql
+credit_ledger_flush_size = 500  # players with changes that trigger an early write
+player_cache_size = 10000  # players whose accounts are kept in memory